@@ -1,7 +1,6 @@
 import logging
 from os.path import isdir, exists
 
-import yarl
 import curio
 from curio import ssl
 from requests.adapters import BaseAdapter
@@ -10,9 +9,10 @@ from requests.adapters import (
 from requests.exceptions import ConnectionError
 
 from .models import CuResponse, MultipartBody, StreamBody
-from .utils import select_proxy, normalize_timeout
+from .utils import select_proxy, normalize_timeout, parse_request_url
 from .cuhttp import ResponseParser, RequestSerializer
 from .connection_pool import ConnectionPool
+from .network import sendall_buffered
 
 DEFAULT_CONNS_PER_NETLOC = 10
 DEFAULT_CONNS_TOTAL = 100
@@ -51,18 +51,39 @@ class CuHTTPAdapter(BaseAdapter):
     def __init__(self, *,
                  max_conns_per_netloc=DEFAULT_CONNS_PER_NETLOC,
                  max_conns_total=DEFAULT_CONNS_TOTAL,
+                 max_conns_idle_time=None,
                  ):
         super().__init__()
+        self._ssl_contexts = {}  # (verify, cert): ssl_context
         self._pool = ConnectionPool(
             max_conns_per_netloc=max_conns_per_netloc,
             max_conns_total=max_conns_total,
+            max_idle_time=max_conns_idle_time,
         )
 
     def get_ssl_params(self, url, verify, cert):
         if url.scheme != 'https' or (not verify and not cert):
             return {'ssl_context': None}
-
         ssl_params = {}
+        if verify:
+            ssl_params['server_hostname'] = url.host
+        ssl_params['ssl_context'] = self._get_ssl_context(verify, cert)
+        return ssl_params
+
+    def _get_ssl_context(self, verify, cert):
+        """Get SSL context from cache, create it if not exists"""
+        if not isinstance(verify, str):
+            verify = bool(verify)
+        if cert is not None and not isinstance(cert, str):
+            cert = tuple(cert)
+        key = (verify, cert)
+        ssl_context = self._ssl_contexts.get(key)
+        if ssl_context is None:
+            ssl_context = self._create_ssl_context(verify, cert)
+            self._ssl_contexts[key] = ssl_context
+        return ssl_context
+
+    def _create_ssl_context(self, verify, cert):
         ssl_context = ssl.create_default_context()
 
         if verify:
@@ -75,7 +96,6 @@ class CuHTTPAdapter(BaseAdapter):
                     ssl_context.load_verify_locations(capath=verify)
                 else:
                     ssl_context.load_verify_locations(cafile=verify)
-            ssl_params['server_hostname'] = url.raw_host
             ssl_context.verify_mode = ssl.CERT_REQUIRED
 
         if cert:
@@ -94,8 +114,7 @@ class CuHTTPAdapter(BaseAdapter):
                     f'invalid path: {key_file}')
             ssl_context.load_cert_chain(cert_file, key_file)
 
-        ssl_params['ssl_context'] = ssl_context
-        return ssl_params
+        return ssl_context
 
     async def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
         """Sends PreparedRequest object. Returns Response object.
@@ -114,31 +133,36 @@ class CuHTTPAdapter(BaseAdapter):
         :rtype: requests.Response
         """
         logger.debug(f'Send request: {request.method} {request.url}')
-        url = yarl.URL(request.url)
-        request.headers.setdefault('Host', url.raw_host)
+        url = parse_request_url(request)
+        if 'Host' not in request.headers:
+            request.headers['Host'] = url.host
 
         ssl_params = self.get_ssl_params(url, verify, cert)
         timeout = normalize_timeout(timeout)
         proxy = select_proxy(
-            url.scheme, host=url.raw_host, port=url.port, proxies=proxies)
+            url.scheme, host=url.host, port=url.port, proxies=proxies)
         conn = await self._pool.get(
             scheme=url.scheme,
-            host=url.raw_host,
+            host=url.host,
             port=url.port,
             timeout=timeout.connect,
             proxy=proxy,
             **ssl_params,
         )
 
-        request_path = url.raw_path
-        if url.raw_query_string:
-            request_path += '?' + url.raw_query_string
+        request_path = url.path
         if conn.proxy and conn.proxy.scheme == 'http' and url.scheme == 'http':
-            origin = f'{url.scheme}://{url.raw_host}:{url.port}'
+            origin = f'{url.scheme}://{url.host}:{url.port}'
             request_path = origin + request_path
         body = body_stream = None
-        if isinstance(request.body, (MultipartBody, StreamBody)):
-            body_stream = request.body
+        if isinstance(request.body, MultipartBody):
+            body_stream = request.body.sendfile_parts()
+        elif isinstance(request.body, StreamBody):
+            content_length = request.headers.get('Content-Length')
+            if content_length is not None:
+                body_stream = request.body.sendfile_parts(int(content_length))
+            else:
+                body_stream = request.body
         else:
             body = request.body
         serializer = RequestSerializer(
@@ -152,8 +176,7 @@ class CuHTTPAdapter(BaseAdapter):
         sock = conn.sock
         try:
             try:
-                async for bytes_to_send in serializer:
-                    await sock.sendall(bytes_to_send)
+                await sendall_buffered(sock, serializer)
                 raw = await ResponseParser(sock, timeout=timeout.read).parse()
             except (curio.socket.error) as err:
                 raise ConnectionError(err, request=request)
@@ -164,10 +187,7 @@ class CuHTTPAdapter(BaseAdapter):
         response = self.build_response(request, raw, conn)
         logger.debug(f'Receive response: {response}')
         if not stream:
-            content = []
-            async for chunk in raw.stream(CONTENT_CHUNK_SIZE):
-                content.append(chunk)
-            content = b''.join(content)
+            content = await self._read_content(raw)
             logger.debug(f'Readed response body, length {len(content)}')
             if raw.keep_alive:
                 await conn.release()
@@ -177,6 +197,10 @@ class CuHTTPAdapter(BaseAdapter):
             response._content_consumed = True
         return response
 
+    async def _read_content(self, raw):
+        """Read all response body"""
+        return await raw.read(CONTENT_CHUNK_SIZE)
+
     def build_response(self, req, resp, conn):
         """Builds a :class:`Response <requests.Response>` object from a urllib3
         response. This should not be called from user code, and is only exposed
@@ -192,8 +216,11 @@ class CuHTTPAdapter(BaseAdapter):
         # Fallback to None if there's no status_code, for whatever reason.
         response.status_code = getattr(resp, 'status', None)
 
-        # Make headers case-insensitive.
-        response.headers = CaseInsensitiveDict(getattr(resp, 'headers', {}))
+        # Make headers case-insensitive, the parser already did it.
+        headers = getattr(resp, 'headers', {})
+        if not isinstance(headers, CaseInsensitiveDict):
+            headers = CaseInsensitiveDict(headers)
+        response.headers = headers
 
         # Set encoding.
         response.encoding = get_encoding_from_headers(response.headers)
@@ -206,7 +233,8 @@ class CuHTTPAdapter(BaseAdapter):
             response.url = req.url
 
         # Add new cookies from the server.
-        extract_cookies_to_jar(response.cookies, req, resp)
+        if 'Set-Cookie' in response.headers:
+            extract_cookies_to_jar(response.cookies, req, resp)
 
         # Give the Response some context.
         response.request = req
@@ -221,4 +249,5 @@ class CuHTTPAdapter(BaseAdapter):
         which closes any pooled connections.
         """
         logger.debug(f'Close adapter {self}')
+        self._ssl_contexts.clear()
         await self._pool.close()
@@ -10,18 +10,33 @@ Usage:
         # else connection will release to pool
 """
 import logging
+from time import monotonic
 from base64 import b64encode
+import curio
 from yarl import URL
 from curio.io import WantRead, WantWrite
 from requests.exceptions import ProxyError
 
 from .resource_pool import ResourcePool, ResourcePoolClosedError
 from .future import Future
-from .cuhttp import RequestSerializer, ResponseParser
+from .cuhttp import ResponseParser
 from .network import open_connection, ssl_wrap_socket
 
 logger = logging.getLogger(__name__)
 
+# interval in seconds to close connections idle too long
+PRUNE_INTERVAL = 30
+
+# connections idle shorter than it are reused without checking peer closed,
+# the check is done when releasing, servers rarely close keep-alive
+# connections so soon
+PEER_CHECK_IDLE_TIME = 1.0
+
+# connection states
+_BUSY = 0
+_RELEASED = 1
+_CLOSED = 2
+
 
 def _basic_auth_str(username, password):
     """Returns a Basic Auth string."""
@@ -29,6 +44,15 @@ def _basic_auth_str(username, password):
     return 'Basic ' + b64encode(auth).decode('utf-8').strip()
 
 
+def _format_connect_request(host, port, proxy_auth=None):
+    """Format a CONNECT request, it's fixed so no need RequestSerializer"""
+    target = f'{host}:{port}'
+    request = f'CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n'
+    if proxy_auth:
+        request += f'Proxy-Authorization: {proxy_auth}\r\n'
+    return (request + '\r\n').encode('latin-1')
+
+
 class ConnectionPoolClosedError(ResourcePoolClosedError):
     """Connection pool closed"""
 
@@ -36,7 +60,7 @@ class ConnectionPoolClosedError(ResourcePoolClosedError):
 async def _close_connection_if_need(resource):
     if resource is not None:
         conn = resource.connection
-        conn._closed = True
+        conn._state = _CLOSED
         await conn.sock.close()
         logger.debug(f'Connection {conn} closed')
 
@@ -61,38 +85,47 @@ class Connection:
         self.scheme, self.host, self.port = resource.key
         self.sock = sock
         self.proxy = proxy
-        self._closed = False
-        self._released = False
+        self._state = _BUSY
 
     @property
     def closed(self):
-        return self._closed
+        return self._state == _CLOSED
 
     @property
     def released(self):
-        return self._released
+        return self._state == _RELEASED
 
     def _is_peer_closed(self):
         """check if socket in close-wait state"""
         # the socket is non-blocking mode, read 1 bytes will return EOF
-        # which means peer closed, or raise exception means alive
+        # which means peer closed, or raise WantRead/WantWrite means alive,
+        # other errors eg: connection reset also means the socket is unusable
         try:
             r = self.sock._socket_recv(1)  # FIXME: I use a private method, bad!
         except WantRead:
             return False
         except WantWrite:
             return False
-        assert r == b'', "is_peer_closed shouldn't be called at this time!"
+        except OSError as ex:
+            logger.info(f'Idle connection {self} broken: {ex!r}')
+            return True
+        if r:
+            logger.warning(f'Unexpected data received from idle connection: {self}')
         return True
 
     async def _close_or_release(self, close=False):
-        if self._closed or self._released:
+        if self._state:
             return
+        if not close and self._is_peer_closed():
+            logger.info(f"Detected connection's peer closed, will close the connection: {self}")
+            close = True
         action = 'Close' if close else 'Release'
         logger.debug(f'{action} connection {self}')
         pool_ret = self._resource_pool.put(self._resource, close=close)
-        self._released = True
-        await _close_connection_if_need(pool_ret.need_close)
+        self._state = _RELEASED
+        # only await on slow path, release to idle is pure synchronous
+        if pool_ret.need_close is not None:
+            await _close_connection_if_need(pool_ret.need_close)
         if pool_ret.need_notify is not None:
             fut, result = pool_ret.need_notify
             await fut.set_result(result)
@@ -123,11 +156,7 @@ class Connection:
             proxy = ' proxy={}'.format(proxy)
         else:
             proxy = ''
-        status = 'busy'
-        if self.released:
-            status = 'idle'
-        if self.closed:
-            status = 'closed'
+        status = ('busy', 'idle', 'closed')[self._state]
         return f'<{type(self).__name__} {scheme}://{host}:{port}{proxy} [{status}]>'
 
 
@@ -137,13 +166,22 @@ class ConnectionPool:
     Attrs:
         max_conns_per_netloc (int): max connections per netloc
         max_conns_total (int): max connections in total
+        max_idle_time (float): close connections idle longer than it,
+            None means never close idle connections
     """
 
-    def __init__(self, max_conns_per_netloc=10, max_conns_total=100):
+    def __init__(self, max_conns_per_netloc=10, max_conns_total=100,
+                 max_idle_time=None):
         self.max_conns_per_netloc = max_conns_per_netloc
         self.max_conns_total = max_conns_total
+        self.max_idle_time = max_idle_time
+        self._pruner = None
+        # parsed proxy urls and CONNECT request bytes, they contain proxy
+        # credentials so are kept per pool and cleared when pool closed
+        self._proxy_urls = {}
+        self._connect_requests = {}
         self._pool = ResourcePool(
-            future_class=Future,
+            future_class=Future.acquire,
             max_items_per_key=max_conns_per_netloc,
             max_items_total=max_conns_total,
         )
@@ -159,7 +197,10 @@ class ConnectionPool:
                 **ssl_params
             )
             return Connection(self._pool, resource, sock)
-        proxy = URL(proxy)
+        proxy_url = self._proxy_urls.get(proxy)
+        if proxy_url is None:
+            proxy_url = self._proxy_urls[proxy] = URL(proxy)
+        proxy = proxy_url
         logger.debug(f'Connect to proxy {proxy}')
         sock = await open_connection(
             host=proxy.raw_host,
@@ -173,15 +214,16 @@ class ConnectionPool:
         if not ssl_params.get('ssl_context'):
             logger.debug(f'Forward HTTP request to {proxy}')
             return conn
-        headers = {}
-        if proxy.raw_user:
-            auth = _basic_auth_str(proxy.raw_user, proxy.password)
-            headers['Proxy-Authorization'] = auth
-        path = f'{conn.host}:{conn.port}'
         logger.debug(f'Setup HTTP tunnel {proxy}')
-        request = RequestSerializer(path, method='CONNECT', headers=headers)
-        async for chunk in request:
-            await conn.sock.sendall(chunk)
+        key = (proxy, conn.host, conn.port)
+        request = self._connect_requests.get(key)
+        if request is None:
+            auth = None
+            if proxy.raw_user:
+                auth = _basic_auth_str(proxy.raw_user, proxy.password)
+            request = _format_connect_request(conn.host, conn.port, auth)
+            self._connect_requests[key] = request
+        await conn.sock.sendall(request)
         response = await ResponseParser(conn.sock).parse()
         if response.status != 200:
             raise ProxyError(response)
@@ -216,8 +258,14 @@ class ConnectionPool:
             timeout (int): connection timeout in seconds
             **kwargs: see curio.open_connection
         """
+        if self.max_idle_time is not None and not self._pruner_alive():
+            await self.start_pruner()
         while True:
             conn = await self._get(scheme, host, port, **kwargs)
+            # new connections and connections released just now are alive
+            idle_since = conn._resource.idle_since
+            if idle_since is None or monotonic() - idle_since < PEER_CHECK_IDLE_TIME:
+                return conn
             if conn._is_peer_closed():
                 logger.info(f"Detected connection's peer closed, will close the connection: {conn}")
                 await conn.close()
@@ -229,19 +277,55 @@ class ConnectionPool:
             pool_ret = self._pool.get((scheme, host, port))
         except ResourcePoolClosedError as ex:
             raise ConnectionPoolClosedError('Connection pool closed') from ex
-        await _close_connection_if_need(pool_ret.need_close)
+        if pool_ret.need_close is not None:
+            await _close_connection_if_need(pool_ret.need_close)
         if pool_ret.need_wait is not None:
-            pool_ret = await pool_ret.need_wait
+            fut = pool_ret.need_wait
+            pool_ret = await fut
+            # only release when notified, a cancelled waiter's future
+            # is still in the pool's waiting queue
+            fut.release()
 
         if pool_ret.need_open is not None:
             conn = await self._open_connection(pool_ret.need_open, **kwargs)
             logger.debug(f'Get new connection: {conn}')
         else:
             conn = pool_ret.idle.connection
-            conn._released = False
+            conn._state = _BUSY
             logger.debug(f'Get an idle connection: {conn}')
         return conn
 
+    async def prune(self):
+        """Close connections idle longer than max_idle_time"""
+        if self.max_idle_time is None:
+            return
+        need_close = self._pool.prune(self.max_idle_time)
+        if need_close:
+            logger.debug(f'Prune {len(need_close)} idle connections')
+        for resource in need_close:
+            await _close_connection_if_need(resource)
+
+    async def _prune_loop(self, interval):
+        while True:
+            await curio.sleep(interval)
+            await self.prune()
+
+    def _pruner_alive(self):
+        # the pruner is cancelled when its kernel shuts down, eg: at the end
+        # of curio.run, so a later kernel must start a new one
+        return self._pruner is not None and not self._pruner.terminated
+
+    async def start_pruner(self, interval=PRUNE_INTERVAL):
+        """Start a background task to prune idle connections periodically"""
+        if not self._pruner_alive():
+            self._pruner = await curio.spawn(self._prune_loop, interval, daemon=True)
+
+    async def stop_pruner(self):
+        """Stop the background prune task"""
+        if self._pruner is not None:
+            pruner, self._pruner = self._pruner, None
+            await pruner.cancel()
+
     async def close(self, force=False):
         """Close the connection pool
 
@@ -249,6 +333,9 @@ class ConnectionPool:
             force (bool): close busy connections or not
         """
         logger.debug(f'Close connection pool: {self}')
+        await self.stop_pruner()
+        self._proxy_urls.clear()
+        self._connect_requests.clear()
         need_close, need_wait = self._pool.close(force=force)
         ex = ConnectionPoolClosedError('Connection pool closed')
         for resource in need_close:
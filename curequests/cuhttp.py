@@ -1,5 +1,6 @@
 import zlib
-from collections import namedtuple
+from collections import namedtuple, deque
+from functools import lru_cache
 import httptools
 from curio import timeout_after, TaskTimeout
 from curio.io import StreamBase
@@ -40,10 +41,13 @@ Response = namedtuple('Response', [
     'keep_alive',
     'headers',
     'stream',
+    'read',
 ])
 
 MAX_BUFFER_SIZE = 64 * 1024
 DEFAULT_BUFFER_SIZE = 4 * 1024
+# small body will be sent together with headers in one write
+MAX_COALESCE_BODY_SIZE = 64 * 1024
 
 
 class ResponseStream(StreamBase):
@@ -91,12 +95,13 @@ class ResponseParser:
         self.version = None
         self.status = None
         self.reason = b''
-        self.headers = []
+        self.headers = CaseInsensitiveDict()
 
         # temp attrs
         self.current_buffer_size = self.buffer_size
+        self._buffer = None  # reusable receive buffer
         self.header_name = b''
-        self.body_chunks = []
+        self.body_chunks = deque()
 
         # state
         self.started = False
@@ -113,7 +118,7 @@ class ResponseParser:
     def on_header(self, name: bytes, value: bytes or None):
         self.header_name += name
         if value is not None:
-            self.headers.append((self.header_name.decode(), value.decode()))
+            self.headers[self.header_name.decode()] = value.decode()
             self.header_name = b''
 
     def on_headers_complete(self):
@@ -121,7 +126,6 @@ class ResponseParser:
         self.status = self._parser.get_status_code()
         self.reason = self.reason.decode()
         self.keep_alive = self._parser.should_keep_alive()
-        self.headers = CaseInsensitiveDict(self.headers)
         self.headers_completed = True
 
     def on_body(self, body: bytes):
@@ -129,23 +133,44 @@ class ResponseParser:
         # is large, eg: len(data) > 8192, so we should store `body` in a list
         self.body_chunks.append(body)
 
+    def _take_body(self):
+        """Take body chunks of a `feed_data` as one bytes"""
+        chunks = self.body_chunks
+        if len(chunks) == 1:
+            return chunks.popleft()
+        body = b''.join(chunks)
+        chunks.clear()
+        return body
+
     def on_message_complete(self):
         self.completed = True
     # ========= end httptools callbacks ========
 
     async def recv(self):
+        """Receive data into the reusable buffer
+
+        Returns:
+            memoryview: the received data, only valid before next recv
+        """
+        size = self.current_buffer_size
+        if self._buffer is None or len(self._buffer) < size:
+            self._buffer = memoryview(bytearray(size))
+        buffer = self._buffer[:size]
         if not self.timeout or self.timeout <= 0:
-            return await self._sock.recv(self.current_buffer_size)
+            nbytes = await self._sock.recv_into(buffer)
         else:
             try:
-                return await timeout_after(
+                nbytes = await timeout_after(
                     self.timeout,
-                    self._sock.recv(self.current_buffer_size)
+                    self._sock.recv_into(buffer)
                 )
             except TaskTimeout as ex:
                 raise ReadTimeoutError(str(ex)) from None
+        return buffer[:nbytes]
 
     def _set_current_buffer_size(self, buffer_size):
+        if not buffer_size or buffer_size <= 0:
+            buffer_size = self.buffer_size
         self.current_buffer_size = buffer_size
 
     def _get_decoder(self):
@@ -164,7 +189,8 @@ class ResponseParser:
                 break
         if not self.headers_completed:
             raise ProtocolError('incomplete response headers')
-        body_stream = self.body_stream()
+        raw_body_stream = self.body_stream()
+        body_stream = raw_body_stream
         decoder = self._get_decoder()
         if decoder:
             body_stream = _decompress(body_stream, decoder)
@@ -173,6 +199,17 @@ class ResponseParser:
             self._set_current_buffer_size(chunk_size)
             return body_stream
 
+        async def read(chunk_size=DEFAULT_BUFFER_SIZE):
+            """Read all body, don't mix with stream"""
+            self._set_current_buffer_size(chunk_size)
+            chunks = []
+            async for chunk in raw_body_stream:
+                chunks.append(chunk)
+            body = b''.join(chunks)
+            if decoder:
+                body = _decompress_all(body, decoder)
+            return body
+
         environ = dict(
             version=self.version,
             status=self.status,
@@ -180,24 +217,55 @@ class ResponseParser:
             keep_alive=self.keep_alive,
             headers=self.headers,
             stream=stream,
+            read=read,
         )
         return Response(**environ)
 
     async def body_stream(self):
-        while self.body_chunks:
-            yield self.body_chunks.pop(0)
+        if self.body_chunks:
+            yield self._take_body()
         while not self.completed:
             data = await self.recv()
             # feed data even when data is empty, so parser will completed
             self._parser.feed_data(data)
-            while self.body_chunks:
-                yield self.body_chunks.pop(0)
+            if self.body_chunks:
+                yield self._take_body()
             if not data:
                 break
         if not self.completed:
             raise ProtocolError('incomplete response body')
 
 
+# headers whose values are the same across requests, only these are
+# cached, values of the others may be secrets or change every request
+_CACHED_HEADER_NAMES = frozenset([
+    'host', 'user-agent', 'accept', 'accept-encoding',
+    'accept-language', 'connection', 'transfer-encoding',
+])
+
+
+def _encode_header(name, value):
+    if isinstance(name, str):
+        name = name.encode('latin-1')
+    if isinstance(value, str):
+        value = value.encode('latin-1')
+    elif not isinstance(value, bytes):
+        value = str(value).encode('latin-1')
+    return name + b': ' + value + b'\r\n'
+
+
+_encode_cached_header = lru_cache(maxsize=256)(_encode_header)
+
+
+def _format_header(name, value):
+    """Format a header line, stable headers, eg: User-Agent, Accept
+    and Host, are cached because they are the same across requests.
+    """
+    if isinstance(name, str) and name.lower() in _CACHED_HEADER_NAMES:
+        return _encode_cached_header(name, value)
+    return _encode_header(name, value)
+
+
 class RequestSerializer:
     def __init__(self, path, method='GET', *, version='HTTP/1.1', headers=None,
                  body=b'', body_stream=None):
@@ -212,10 +280,13 @@ class RequestSerializer:
         self.body_stream = body_stream
 
     def _format_headers(self):
-        headers = [f'{self.method} {self.path} {self.version}']
-        for k, v in self.headers.items():
-            headers.append(f'{k}: {v}')
-        return '\r\n'.join(headers).encode() + b'\r\n\r\n'
+        request_line = f'{self.method} {self.path} {self.version}\r\n'
+        headers = self.headers
+        return b''.join([
+            request_line.encode('latin-1'),
+            *map(_format_header, headers.keys(), headers.values()),
+            b'\r\n',
+        ])
 
     def _format_chunk(self, chunk):
         return format(len(chunk), 'X').encode() + b'\r\n' + chunk + b'\r\n'
@@ -228,9 +299,14 @@ class RequestSerializer:
             # one-off request
             if self.method in {'POST', 'PUT', 'PATCH'}:
                 self.headers['Content-Length'] = len(self.body)
-            yield self._format_headers()
-            if self.body:
-                yield self.body
+            headers = self._format_headers()
+            if not self.body:
+                yield headers
+            elif len(self.body) <= MAX_COALESCE_BODY_SIZE:
+                yield headers + self.body
+            else:
+                # large body, avoid copying it, see network.sendall
+                yield [headers, self.body]
         else:
             # stream request
             if self._is_chunked():
@@ -251,3 +327,22 @@ async def _decompress(body_stream, decoder):
         yield decoder.decompress(chunk)
     buf = decoder.decompress(b'')
     yield buf + decoder.flush()
+
+
+def _decompress_all(body, decoder):
+    """Decompress whole body in one shot, fallback to the decoder for
+    unusual data, eg: multi-member gzip or raw deflate.
+    """
+    if isinstance(decoder, GzipDecoder):
+        obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    else:
+        obj = zlib.decompressobj()
+    try:
+        data = obj.decompress(body)
+    except zlib.error:
+        pass
+    else:
+        if obj.eof and not obj.unused_data:
+            return data
+    buf = decoder.decompress(body)
+    return buf + decoder.flush()
@@ -1,23 +1,64 @@
-from curio import Event
+from curio.sched import SchedFIFO
+from curio.traps import _scheduler_wait, _scheduler_wake
+
+# max number of released futures kept for reuse
+MAX_FREE_FUTURES = 1024
 
 
 class Future:
+    """A single-waiter future, the resource pool allocates one per waiter
+
+    Use Future.acquire() and future.release() to reuse futures instead of
+    allocating a new one for every waiter.
+
+    Unlike curio.Event, setting a result doesn't trap into the kernel
+    if nobody is waiting yet.
+    """
+
+    __slots__ = ('_waiting', '_done', '_result', '_exception')
+
+    _free = []  # released futures
 
     def __init__(self):
-        self._event = Event()
+        self._waiting = SchedFIFO()
+        self._done = False
+        self._result = None
+        self._exception = None
+
+    @classmethod
+    def acquire(cls):
+        """Get a future from the free list, or create a new one"""
+        if cls._free:
+            return cls._free.pop()
+        return cls()
+
+    def release(self):
+        """Reset the future and put it back to the free list
+
+        The future must not be used after release.
+        """
+        self._done = False
         self._result = None
         self._exception = None
+        if len(self._free) < MAX_FREE_FUTURES:
+            self._free.append(self)
+
+    async def _set_done(self):
+        self._done = True
+        if self._waiting:
+            await _scheduler_wake(self._waiting, len(self._waiting))
 
     async def set_result(self, result):
         self._result = result
-        await self._event.set()
+        await self._set_done()
 
     async def set_exception(self, exception):
         self._exception = exception
-        await self._event.set()
+        await self._set_done()
 
     async def _get_result(self):
-        await self._event.wait()
+        if not self._done:
+            await _scheduler_wait(self._waiting, 'FUTURE_WAIT')
 
         if self._exception is not None:
             raise self._exception
@@ -1,7 +1,12 @@
-import inspect
+import io
+import os
+import re
+import stat
 import logging
 import mimetypes
 from uuid import uuid4
+from datetime import timedelta
+from functools import lru_cache
 from os.path import basename
 from urllib.parse import quote
 
@@ -9,25 +14,59 @@ from curio.meta import finalize
 from curio.file import AsyncFile
 from requests.models import Request, Response, PreparedRequest
 from requests.utils import super_len, to_key_val_list
+from requests.cookies import RequestsCookieJar
 from requests.exceptions import (
     ChunkedEncodingError, ContentDecodingError,
     ConnectionError, StreamConsumedError, UnrewindableBodyError)
 from requests.models import ITER_CHUNK_SIZE
+try:
+    import orjson
+except ImportError:  # optional, faster json parsing
+    orjson = None
 
 from .utils import stream_decode_response_unicode, iter_slices
 from .cuhttp import DecodeError, ProtocolError, ReadTimeoutError
+from .cuhttp import MAX_COALESCE_BODY_SIZE
+from .network import FileRange
 
 logger = logging.getLogger(__name__)
 
 EOL = '\r\n'
 bEOL = b'\r\n'
 
+# errors raised when reading response body, and the requests errors they map to
+_STREAM_ERRORS = {
+    ProtocolError: ChunkedEncodingError,
+    DecodeError: ContentDecodingError,
+    ReadTimeoutError: ConnectionError,
+}
+_STREAM_ERROR_TYPES = tuple(_STREAM_ERRORS)
+
+
+def _wrap_stream_error(ex):
+    for error_type, wrapper in _STREAM_ERRORS.items():
+        if isinstance(ex, error_type):
+            return wrapper(ex)
+
+
+# encodings orjson can parse, it only accepts utf-8
+_UTF8_NAMES = {'utf-8', 'utf8'}
+# orjson parses integers beyond 64 bits as float, leave them to json
+_LONG_DIGITS_RE = re.compile(rb'\d{19}')
+
+# default chunk size of iter_content, it's also the socket read size
+# when streaming, small chunks cost a recv call each
+ITER_CONTENT_CHUNK_SIZE = 64 * 1024
+
 
 class CuResponse(Response):
     """The :class:`CuResponse <CuResponse>` object, which contains a
     server's response to an async HTTP request.
     """
 
+    # (content, parsed json), cached by json()
+    _json_cache = None
+
     def __enter__(self):
         raise AttributeError(
             f'{type(self).__name__} not support synchronous context '
@@ -44,6 +83,21 @@ class CuResponse(Response):
     async def __aexit__(self, *args):
         await self.close()
 
+    @property
+    def elapsed(self):
+        """The amount of time elapsed between sending the request
+        and the arrival of the response, built on first access
+        """
+        elapsed = self._elapsed
+        if not isinstance(elapsed, timedelta):
+            elapsed = self._elapsed = timedelta(seconds=elapsed)
+        return elapsed
+
+    @elapsed.setter
+    def elapsed(self, value):
+        """Set elapsed time, as timedelta or seconds"""
+        self._elapsed = value
+
     def __iter__(self):
         raise AttributeError(
             f'{type(self).__name__} not support synchronous iter, '
@@ -51,9 +105,9 @@ class CuResponse(Response):
 
     def __aiter__(self):
         """Allows you to use a response as an iterator."""
-        return self.iter_content(128)
+        return self.iter_content(ITER_CONTENT_CHUNK_SIZE)
 
-    def iter_content(self, chunk_size=1, decode_unicode=False):
+    def iter_content(self, chunk_size=ITER_CONTENT_CHUNK_SIZE, decode_unicode=False):
         """Iterates over the response data.  When stream=True is set on the
         request, this avoids reading the content at once into memory for
         large responses.  The chunk size is the number of bytes it should
@@ -74,26 +128,17 @@ class CuResponse(Response):
         elif chunk_size is not None and not isinstance(chunk_size, int):
             raise TypeError('chunk_size must be an int, it is instead a %s.' % type(chunk_size))
 
-        async def generate():
-            async with self:
-                async with finalize(self.raw.stream(chunk_size)) as gen:
-                    logger.debug(f'Iterate response body stream: {self}')
-                    try:
-                        async for trunk in gen:
-                            yield trunk
-                    except ProtocolError as e:
-                        raise ChunkedEncodingError(e)
-                    except DecodeError as e:
-                        raise ContentDecodingError(e)
-                    except ReadTimeoutError as e:
-                        raise ConnectionError(e)
-                    self._content_consumed = True
-
         if self._content_consumed:
+            content = self._content
+            if decode_unicode and self.encoding is not None:
+                # decode the whole content once rather than slice by slice
+                content = str(content, self.encoding, errors='replace')
+                decode_unicode = False
             # simulate reading small chunks of the content
-            chunks = iter_slices(self._content, chunk_size)
+            chunks = iter_slices(content, chunk_size)
         else:
-            chunks = generate()
+            logger.debug(f'Iterate response body stream: {self}')
+            chunks = _ResponseBodyIterator(self, self.raw.stream(chunk_size))
 
         if decode_unicode:
             chunks = stream_decode_response_unicode(chunks, self)
@@ -108,6 +153,8 @@ class CuResponse(Response):
         .. note:: This method is not reentrant safe.
         """
 
+        # fragments of the unterminated line, they are joined only when the
+        # line ends, so a long line across many chunks is copied only once
         pending = None
 
         gen = self.iter_content(chunk_size=chunk_size, decode_unicode=decode_unicode)
@@ -116,7 +163,12 @@ class CuResponse(Response):
             async for chunk in gen:
 
                 if pending is not None:
-                    chunk = pending + chunk
+                    if not _has_line_end(pending, chunk, delimiter):
+                        if chunk:
+                            pending.append(chunk)
+                        continue
+                    pending.append(chunk)
+                    chunk = chunk[:0].join(pending)
 
                 if delimiter:
                     lines = chunk.split(delimiter)
@@ -124,7 +176,7 @@ class CuResponse(Response):
                     lines = chunk.splitlines()
 
                 if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
-                    pending = lines.pop()
+                    pending = [lines.pop()]
                 else:
                     pending = None
 
@@ -132,7 +184,7 @@ class CuResponse(Response):
                     yield line
 
         if pending is not None:
-            yield pending
+            yield pending[0][:0].join(pending)
 
     @property
     def content(self):
@@ -155,6 +207,33 @@ class CuResponse(Response):
         # since we exhausted the data.
         return self._content
 
+    def json(self, **kwargs):
+        """Decodes the JSON response body (if any) as a Python object.
+
+        The result is cached when called without arguments, it's shared
+        by later calls so don't modify it.
+        """
+        if kwargs:
+            return super().json(**kwargs)
+        cache = self._json_cache
+        if cache is not None and cache[0] is self._content:
+            return cache[1]
+        content = self.content
+        use_orjson = (
+            orjson is not None and isinstance(content, bytes) and
+            (self.encoding or 'utf-8').lower() in _UTF8_NAMES and
+            _LONG_DIGITS_RE.search(content) is None)
+        if use_orjson:
+            try:
+                value = orjson.loads(content)
+            except orjson.JSONDecodeError:
+                # let json report the error, or parse what orjson rejects
+                value = super().json()
+        else:
+            value = super().json()
+        self._json_cache = (self._content, value)
+        return value
+
     async def close(self):
         if self._content_consumed:
             if self.raw.keep_alive:
@@ -166,6 +245,83 @@ class CuResponse(Response):
             await self.connection.close()
 
 
+class _ResponseBodyIterator:
+    """Iterate response body stream, the response will be closed when
+    the stream exhausted, failed or the iterator closed.
+
+    It's a plain async iterator rather than an async generator wrapping
+    the stream, so each chunk costs one __anext__ call instead of two.
+    """
+
+    __slots__ = ('_response', '_stream', '_closed')
+
+    def __init__(self, response, stream):
+        self._response = response
+        self._stream = stream
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._response._content_consumed = True
+            await self.aclose()
+            raise
+        except BaseException as ex:
+            await self.aclose()
+            if isinstance(ex, _STREAM_ERROR_TYPES):
+                raise _wrap_stream_error(ex)
+            raise
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._stream.aclose()
+        finally:
+            await self._response.close()
+
+
+def _has_line_end(pending, chunk, delimiter):
+    """Check if chunk ends the pending line
+
+    Params:
+        pending (list): non-empty fragments of the pending line
+        chunk (bytes or str): the new chunk
+        delimiter (bytes or str): line delimiter, None means splitlines
+    """
+    if not chunk:
+        return False
+    if delimiter:
+        n = len(delimiter) - 1
+        if n > 0:
+            # delimiter may be split between pending and chunk
+            chunk = chunk[:0].join(pending[-n:])[-n:] + chunk
+        return delimiter in chunk
+    lines = chunk.splitlines()
+    return len(lines) != 1 or len(lines[0]) != len(chunk)
+
+
+# characters urllib.parse.quote never quotes
+_SAFE_NAME_RE = re.compile(r'[A-Za-z0-9_.~-]+')
+
+
+def _quote_name(name):
+    """Quote a field name or filename, skip quote() if it's already safe"""
+    if isinstance(name, str) and _SAFE_NAME_RE.fullmatch(name):
+        return name
+    return quote(name, safe='')
+
+
+@lru_cache(maxsize=256)
+def _guess_content_type(filename):
+    return mimetypes.guess_type(filename)[0]
+
+
 def encode_headers(headers):
     ret = []
     for k, v in headers.items():
@@ -173,6 +329,37 @@ def encode_headers(headers):
     return EOL.join(ret).encode('ascii')
 
 
+def _file_length(f, position):
+    """Length of the file from position, use fstat for regular files
+    to avoid the seek and tell round trips of super_len.
+    """
+    if position is not None:
+        try:
+            st = os.fstat(f.fileno())
+        except (AttributeError, OSError, ValueError):
+            pass
+        else:
+            if stat.S_ISREG(st.st_mode):
+                return max(st.st_size - position, 0)
+    return super_len(f)
+
+
+def _regular_file_range(file, count):
+    """FileRange of the AsyncFile from its position,
+    None if it's not a regular binary file
+    """
+    with file.blocking() as f:
+        if not isinstance(f, (io.BufferedReader, io.FileIO)):
+            return None
+        try:
+            if not stat.S_ISREG(os.fstat(f.fileno()).st_mode):
+                return None
+            offset = f.tell()
+        except (OSError, ValueError):
+            return None
+    return FileRange(file, offset, count)
+
+
 def safe_tell(f):
     # Record the current file position before reading.
     # This will allow us to rewind a file in the event
@@ -207,7 +394,7 @@ class Field:
 
     def __init__(self, name, *, filename=None, headers=None, content_type=None,
                  file=None, filepath=None, content=None, encoding='utf-8'):
-        self.name = quote(name, safe='')
+        self.name = _quote_name(name)
         self.headers = headers or {}
         self.content_length = None
         self._should_close_file = False
@@ -235,8 +422,8 @@ class Field:
             self._body_position = None
         else:
             with file.blocking() as f:
-                self.content_length = super_len(f)
                 self._body_position = safe_tell(f)
+                self.content_length = _file_length(f, self._body_position)
 
         if filename is None:
             if filepath is None and file is not None:
@@ -244,11 +431,11 @@ class Field:
             if filepath is not None:
                 filename = basename(filepath)
         if filename is not None:
-            filename = quote(filename, safe='')
+            filename = _quote_name(filename)
         self.filename = filename
 
         if content_type is None and filename is not None:
-            content_type = mimetypes.guess_type(filename)[0]
+            content_type = _guess_content_type(filename)
         if content_type is not None:
             self.headers['Content-Type'] = content_type
 
@@ -275,6 +462,12 @@ class Field:
         with self.file.blocking() as f:
             rewind_file(f, self._body_position)
 
+    def _file_range(self):
+        """FileRange of the file, None if it's not a regular binary file"""
+        if self.file is None:
+            return None
+        return _regular_file_range(self.file, self.content_length)
+
 
 class MultipartBody:
 
@@ -285,6 +478,10 @@ class MultipartBody:
         self.boundary = boundary
         self.encoded_boundary = boundary.encode('ascii')
         self.content_type = 'multipart/form-data; boundary={}'.format(boundary)
+        # boundary and headers of each field, built once and reused on rewind
+        sep = b'--' + self.encoded_boundary + bEOL
+        self._preambles = [sep + f.encoded_headers + bEOL + bEOL for f in fields]
+        self._trailer = b'--' + self.encoded_boundary + b'--' + bEOL
         self.content_length = self._compute_content_length()
         self._gen = self._generator()
 
@@ -295,14 +492,11 @@ class MultipartBody:
 
     def _compute_content_length(self):
         eol_len = len(bEOL)
-        boundary_len = len(self.encoded_boundary)
         length = 0
-        for field in self.fields:
-            length += 2 + boundary_len + eol_len
-            length += len(field.encoded_headers) + eol_len
-            length += eol_len
+        for field, preamble in zip(self.fields, self._preambles):
+            length += len(preamble)
             length += field.content_length + eol_len
-        length += 2 + boundary_len + 2 + eol_len
+        length += len(self._trailer)
         return length
 
     def __len__(self):
@@ -312,13 +506,26 @@ class MultipartBody:
         async for chunk in self._gen:
             yield chunk
 
-    async def _generator(self):
+    def sendfile_parts(self):
+        """Iterate the body, regular files are yielded as FileRange
+        so they can be sent by network.sendfile
+        """
+        return self._generator(sendfile=True)
+
+    async def _generator(self, sendfile=False):
         chunk_size = 16 * 1024
-        sep = b'--' + self.encoded_boundary + bEOL
-        for field in self.fields:
-            yield sep + field.encoded_headers + bEOL + bEOL
-            if field.content is not None:
-                yield field.content
+        for field, preamble in zip(self.fields, self._preambles):
+            content = field.content
+            if content is not None and len(content) <= MAX_COALESCE_BODY_SIZE:
+                # small field in one chunk
+                yield b''.join((preamble, content, bEOL))
+                continue
+            yield preamble
+            file_range = field._file_range() if sendfile else None
+            if content is not None:
+                yield content
+            elif file_range is not None:
+                yield file_range
             else:
                 while True:
                     chunk = await field.file.read(chunk_size)
@@ -326,7 +533,11 @@ class MultipartBody:
                         break
                     yield chunk
             yield bEOL
-        yield b'--' + self.encoded_boundary + b'--' + bEOL
+        yield self._trailer
+
+
+# block size to read file of stream body
+STREAM_BODY_CHUNK_SIZE = 64 * 1024
 
 
 class StreamBody:
@@ -335,13 +546,48 @@ class StreamBody:
         self._data = data
         self._body_position = safe_tell(data)
 
-    async def __aiter__(self):
-        if not inspect.isasyncgen(self._data):
-            for chunk in self._data:
-                yield chunk
-        else:
-            async for chunk in self._data:
-                yield chunk
+    def __aiter__(self):
+        data = self._data
+        # files are read in blocks, iterate them yields lines
+        if isinstance(data, AsyncFile):
+            return self._iter_file(data)
+        # async iterable is used directly, no extra generator per chunk
+        if hasattr(data, '__aiter__'):
+            return data.__aiter__()
+        if hasattr(data, 'read'):
+            # AsyncFile reads in a thread, not block the kernel
+            return self._iter_file(AsyncFile(data))
+        return self._iter_sync()
+
+    def sendfile_parts(self, content_length):
+        """Iterate the body, regular file is yielded as one FileRange
+        so it can be sent by network.sendfile
+
+        Params:
+            content_length (int): body length, from Content-Length header
+        """
+        data = self._data
+        if hasattr(data, 'read'):
+            file = data if isinstance(data, AsyncFile) else AsyncFile(data)
+            file_range = _regular_file_range(file, content_length)
+            if file_range is not None:
+                return self._iter_file_range(file_range)
+        return self.__aiter__()
+
+    async def _iter_file_range(self, file_range):
+        yield file_range
+
+    async def _iter_sync(self):
+        for chunk in self._data:
+            yield chunk
+
+    async def _iter_file(self, file):
+        read = file.read
+        while True:
+            chunk = await read(STREAM_BODY_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
 
     def rewind(self):
         rewind_file(self._data, self._body_position)
@@ -389,6 +635,26 @@ class CuPreparedRequest(PreparedRequest):
         self.headers.setdefault('Content-Type', self.body.content_type)
         self.prepare_content_length(self.body)
 
+    def _redirect_copy(self):
+        """Copy for redirection, cheaper than copy() which copies every cookie
+
+        Cookies are never modified in place, so the new jar can share them.
+        """
+        p = CuPreparedRequest()
+        p.method = self.method
+        p.url = self.url
+        p.headers = self.headers.copy()
+        if self._cookies is not None:
+            jar = RequestsCookieJar()
+            jar.set_policy(self._cookies.get_policy())
+            for cookie in self._cookies:
+                jar.set_cookie(cookie)
+            p._cookies = jar
+        p.body = self.body
+        p.hooks = self.hooks
+        p._body_position = self._body_position
+        return p
+
 
 class CuRequest(Request):
     def prepare(self):
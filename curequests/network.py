@@ -1,4 +1,6 @@
+import os
 from curio import ssl, socket
+from curio.traps import _write_wait
 
 
 async def ssl_wrap_socket(
@@ -19,6 +21,24 @@ async def ssl_wrap_socket(
     return sock
 
 
+# detect dead idle connections in about 60 + 30 * 3 seconds
+KEEPALIVE_OPTIONS = [
+    ('TCP_KEEPIDLE', 60),
+    ('TCP_KEEPINTVL', 30),
+    ('TCP_KEEPCNT', 3),
+]
+
+
+def _set_socket_options(sock):
+    # disable Nagle's algorithm, requests are small writes and need no delay
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for name, value in KEEPALIVE_OPTIONS:
+        # these options are not available on all platforms
+        if hasattr(socket, name):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+
+
 async def open_connection(
         # socket.create_connection params
         host, port,
@@ -32,6 +52,7 @@ async def open_connection(
 ):
     sock = await socket.create_connection(
         (host, port), timeout, source_addr)
+    _set_socket_options(sock)
     if not ssl_context:
         return sock
     return await ssl_wrap_socket(
@@ -40,3 +61,147 @@ async def open_connection(
         server_hostname=server_hostname,
         alpn_protocols=alpn_protocols,
     )
+
+
+def _is_ssl_socket(sock):
+    return isinstance(getattr(sock, '_socket', sock), ssl.SSLSocket)
+
+
+async def sendall(sock, data):
+    """Send bytes, or a list of bytes-like buffers
+
+    The buffers are written by scatter-gather sendmsg on plain socket, so
+    they are sent without being concatenated. SSL socket not support
+    sendmsg, the buffers will be sent one by one.
+    """
+    if not isinstance(data, list):
+        await sock.sendall(data)
+        return
+    if _is_ssl_socket(sock):
+        for buffer in data:
+            await sock.sendall(buffer)
+        return
+    buffers = [memoryview(buffer).cast('B') for buffer in data]
+    while buffers:
+        nbytes = await sock.sendmsg(buffers)
+        # drop sent buffers, slice the partial sent one
+        while nbytes > 0:
+            if nbytes >= len(buffers[0]):
+                nbytes -= len(buffers.pop(0))
+            else:
+                buffers[0] = buffers[0][nbytes:]
+                nbytes = 0
+
+
+# small chunks are buffered up to this size before sending
+SEND_BUFFER_SIZE = 64 * 1024
+# sendmsg accepts at most IOV_MAX buffers, it's 1024 on Linux
+MAX_SEND_BUFFERS = 1024
+
+
+class FileRange:
+    """A range of a regular file, sent by sendfile
+
+    Attrs:
+        file (curio.file.AsyncFile): the file
+        offset (int): start position
+        count (int): number of bytes
+    """
+
+    __slots__ = ('file', 'offset', 'count')
+
+    def __init__(self, file, offset, count):
+        self.file = file
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+
+# chunk size to read file when can't use os.sendfile
+SENDFILE_FALLBACK_CHUNK_SIZE = 64 * 1024
+
+
+async def sendfile(sock, file_range):
+    """Send a FileRange
+
+    Plain socket use os.sendfile, the data is copied in kernel without
+    going through user space. SSL socket and platforms without os.sendfile
+    fallback to read and send.
+    """
+    offset, count = file_range.offset, file_range.count
+    if not hasattr(os, 'sendfile') or _is_ssl_socket(sock):
+        file = file_range.file
+        with file.blocking() as f:
+            f.seek(offset)
+        while count > 0:
+            chunk = await file.read(min(count, SENDFILE_FALLBACK_CHUNK_SIZE))
+            if not chunk:
+                raise IOError('file is shorter than expected')
+            await sock.sendall(chunk)
+            count -= len(chunk)
+        return
+    with file_range.file.blocking() as f:
+        file_fd = f.fileno()
+    sock_fd = sock.fileno()
+    while count > 0:
+        try:
+            nbytes = os.sendfile(sock_fd, file_fd, offset, count)
+        except BlockingIOError:
+            await _write_wait(sock_fd)
+            continue
+        if not nbytes:
+            raise IOError('file is shorter than expected')
+        offset += nbytes
+        count -= nbytes
+
+
+async def _send_buffers(sock, buffers, gather):
+    if not buffers:
+        return
+    if len(buffers) == 1:
+        await sock.sendall(buffers[0])
+    elif gather:
+        await sendall(sock, buffers)
+    else:
+        await sock.sendall(b''.join(buffers))
+
+
+async def sendall_buffered(sock, chunks, buffer_size=SEND_BUFFER_SIZE):
+    """Send chunks from an async iterable, small chunks are buffered and
+    sent together. FileRange chunks are sent by sendfile.
+
+    On plain socket the buffered chunks are sent by scatter-gather sendmsg,
+    they are not copied and large chunks are buffered too. SSL socket
+    joins the small chunks so they are encrypted as one record, large
+    chunks are sent directly.
+    """
+    gather = not _is_ssl_socket(sock)
+    buffers = []
+    size = 0
+    async for chunk in chunks:
+        if isinstance(chunk, FileRange):
+            await _send_buffers(sock, buffers, gather)
+            buffers, size = [], 0
+            await sendfile(sock, chunk)
+            continue
+        if gather:
+            if isinstance(chunk, list):
+                buffers.extend(chunk)
+                size += sum(map(len, chunk))
+            else:
+                buffers.append(chunk)
+                size += len(chunk)
+        elif isinstance(chunk, list) or len(chunk) >= buffer_size:
+            await _send_buffers(sock, buffers, gather)
+            buffers, size = [], 0
+            await sendall(sock, chunk)
+            continue
+        else:
+            buffers.append(chunk)
+            size += len(chunk)
+        if size >= buffer_size or len(buffers) >= MAX_SEND_BUFFERS:
+            await _send_buffers(sock, buffers, gather)
+            buffers, size = [], 0
+    await _send_buffers(sock, buffers, gather)
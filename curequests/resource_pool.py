@@ -1,6 +1,8 @@
-from itertools import chain
-from threading import RLock
-from namedlist import namedlist
+from time import monotonic
+from collections import deque, namedtuple, OrderedDict
+
+
+ResourcePoolStats = namedtuple('ResourcePoolStats', 'total idle busy waiting')
 
 
 class ResourcePoolClosedError(Exception):
@@ -10,32 +12,62 @@ class ResourcePoolClosedError(Exception):
 class Resource:
     def __init__(self, key):
         self.key = key
+        self.idle_since = None  # monotonic time when the resource was put back
 
     def __repr__(self):
         return f'<{type(self).__name__} {self.key}>'
 
 
-ResourcePoolResult = namedlist(
-    'ResourcePoolResult',
-    [
+class ResourcePoolResult:
+    """Result of ResourcePool get/put, fields not needed are None"""
+
+    __slots__ = (
         'idle',  # idle resource
         'need_open',  # resource need open
         'need_close',  # resource need close
         'need_notify',  # (future, ResourcePoolResult)
         'need_wait',  # future need wait
-    ],
-    default=None)
+    )
+
+    def __init__(self, idle=None, need_open=None, need_close=None,
+                 need_notify=None, need_wait=None):
+        self.idle = idle
+        self.need_open = need_open
+        self.need_close = need_close
+        self.need_notify = need_notify
+        self.need_wait = need_wait
+
+    def __repr__(self):
+        fields = ', '.join(f'{k}={getattr(self, k)!r}' for k in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class _KeyBucket:
+    """Resources and waitings of a key"""
+
+    __slots__ = ('idle', 'busy', 'waitings', 'size')
+
+    def __init__(self):
+        self.idle = deque()  # idle resources
+        self.busy = set()  # busy resources
+        self.waitings = deque()  # futures waiting for a resource
+        self.size = 0  # number of idle and busy resources
 
 
 class ResourcePool:
-    """A general resource pool algorithm, it's thread safe
+    """A general resource pool algorithm
 
     Params:
-        future_class: a future class
+        future_class: a future class, or a factory returns future
         max_items_per_key (int): max items pre key
         max_items_total (int): max items total
 
     Note: All resource's open/close/await operations are caller's business
+
+    Note: The pool is not thread safe and needs no lock. It's used by tasks
+    of a single curio kernel, and none of its methods await, so a method
+    always runs to completion before another task can touch the pool.
+    Keep it that way: never await between reading and updating the state.
     """
 
     def __init__(self, future_class, max_items_per_key=10, max_items_total=100):
@@ -43,14 +75,17 @@ class ResourcePool:
         self.future_class = future_class
         self.max_items_per_key = max_items_per_key
         self.max_items_total = max_items_total
-        self._idle_resources = {}  # key: [item, ...]
-        self._busy_resources = {}  # key: [item, ...]
-        self._waitings = {}  # key: [promise, ...]
-        # the two numbers is for better performance
+        self._buckets = {}  # key: _KeyBucket
+        # all idle resources, ordered by idle time, oldest first. each key's
+        # idle deque is in the same order, so the oldest idle resource of
+        # the pool is always the leftmost one of its key
+        self._idle_order = OrderedDict()  # resource: None
+        # keys which have waitings, in the order they started waiting
+        self._waiting_keys = {}  # key: None
+        # these numbers are for better performance
         self._num_idle = 0
         self._num_total = 0
-        # keep thread safe
-        self._lock = RLock()
+        self._num_waiting = 0
 
     @property
     def num_idle(self):
@@ -67,15 +102,24 @@ class ResourcePool:
         """Number of total resources"""
         return self._num_total
 
+    def stats(self):
+        """Numbers of the pool in one snapshot
+
+        Returns:
+            ResourcePoolStats
+        """
+        total, idle = self._num_total, self._num_idle
+        return ResourcePoolStats(total, idle, total - idle, self._num_waiting)
+
     def size(self, key):
         """Number of resources with the given key"""
-        r = [self._idle_resources, self._busy_resources]
-        return sum(len(x.get(key, [])) for x in r)
+        bucket = self._buckets.get(key)
+        return bucket.size if bucket is not None else 0
 
     def __repr__(self):
         return f'<{type(self).__name__} idle:{self.num_idle} total:{self.num_total}>'
 
-    def put(self, *args, **kwargs):
+    def put(self, item, close=False):
         """Put back a resource
 
         Params:
@@ -84,35 +128,39 @@ class ResourcePool:
         Returns:
             ResourcePoolResult
         """
-        with self._lock:
-            return self._put(*args, **kwargs)
-
-    def _put(self, item, close=False):
         ret = ResourcePoolResult()
         if self._closed:
             ret.need_close = item
             return ret
 
-        self._busy_resources[item.key].remove(item)
+        bucket = self._buckets[item.key]
         if not close:
-            waitings = self._waitings.get(item.key)
-            if waitings:
-                self._busy_resources[item.key].append(item)
-                # just notify a future in the fastest way
-                ret.need_notify = (waitings.pop(0), ResourcePoolResult(idle=item))
+            item.idle_since = monotonic()
+            if bucket.waitings:
+                # just notify a future in the fastest way, the item keep busy
+                ret.need_notify = (self._pop_waiting(item.key, bucket), ResourcePoolResult(idle=item))
                 return ret
-            self._idle_resources.setdefault(item.key, []).append(item)
+            bucket.busy.discard(item)
+            bucket.idle.append(item)
+            self._idle_order[item] = None
             self._num_idle += 1
         else:
+            bucket.busy.discard(item)
+            bucket.size -= 1
             ret.need_close = item
             self._num_total -= 1
+            self._forget_bucket_if_unused(item.key, bucket)
+
+        # fast path: nobody is waiting, no need to scan the waitings
+        if not self._num_waiting:
+            return ret
 
-        for key, waitings in self._waitings.items():
-            if not waitings:
-                continue
-            need_close, need_open = self._open_new_resource_if_permit(key)
+        for key in self._waiting_keys:
+            bucket = self._buckets[key]
+            need_close, need_open = self._open_new_resource_if_permit(key, bucket)
             if need_open:
-                ret.need_notify = (waitings.pop(0), ResourcePoolResult(need_open=need_open))
+                fut = self._pop_waiting(key, bucket)
+                ret.need_notify = (fut, ResourcePoolResult(need_open=need_open))
                 assert not (need_close and ret.need_close), \
                     "should't close two resource at once, it's a bug!"
                 ret.need_close = need_close
@@ -120,38 +168,67 @@ class ResourcePool:
 
         return ret
 
+    def _pop_waiting(self, key, bucket):
+        """Pop the first waiting future of the key
+
+        Note: callers iterating the waiting keys must stop iterating after calling it
+        """
+        fut = bucket.waitings.popleft()
+        self._num_waiting -= 1
+        if not bucket.waitings:
+            del self._waiting_keys[key]
+        return fut
+
+    def _forget_bucket_if_unused(self, key, bucket):
+        """Remove the bucket which has no resources and waitings,
+        so the pool won't grow with every key it has ever seen.
+
+        Note: callers iterating the buckets must stop iterating after calling it
+        """
+        if not bucket.size and not bucket.waitings:
+            del self._buckets[key]
+
+    def _remove_oldest_idle_resource(self):
+        item, _ = self._idle_order.popitem(last=False)
+        bucket = self._buckets[item.key]
+        bucket.idle.popleft()
+        bucket.size -= 1
+        self._num_idle -= 1
+        self._num_total -= 1
+        self._forget_bucket_if_unused(item.key, bucket)
+        return item
+
     def _close_an_idle_resource(self):
-        for key, idles in self._idle_resources.items():
-            if idles:
-                self._num_idle -= 1
-                self._num_total -= 1
-                return idles.pop(0)
+        if not self._idle_order:
+            return None
+        return self._remove_oldest_idle_resource()
 
-    def _open_new_resource(self, key):
+    def _open_new_resource(self, key, bucket):
         need_open = Resource(key)
-        self._busy_resources.setdefault(key, []).append(need_open)
+        bucket.busy.add(need_open)
+        bucket.size += 1
         self._num_total += 1
         return need_open
 
-    def _open_new_resource_if_permit(self, key):
-        can_open_key = self.size(key) < self.max_items_per_key
+    def _open_new_resource_if_permit(self, key, bucket):
+        can_open_key = bucket.size < self.max_items_per_key
         can_open_total = self._num_total < self.max_items_total
         can_close = self._num_idle > 0
         if can_open_key and can_open_total:
             # open new resource
-            need_open = self._open_new_resource(key)
+            need_open = self._open_new_resource(key, bucket)
             return None, need_open
         elif can_open_key and not can_open_total and can_close:
             # close an idle resource then open new resource
             need_close = self._close_an_idle_resource()
             assert need_close and self._num_total < self.max_items_total, \
                 "pool still full after close an idle resource, it's a bug!"
-            need_open = self._open_new_resource(key)
+            need_open = self._open_new_resource(key, bucket)
             return need_close, need_open
         else:
             return None, None
 
-    def get(self, *args, **kwargs):
+    def get(self, key):
         """Get a resource
 
         Params:
@@ -159,31 +236,49 @@ class ResourcePool:
         Returns:
             ResourcePoolResult
         """
-        with self._lock:
-            return self._get(*args, **kwargs)
-
-    def _get(self, key):
         if self._closed:
             raise ResourcePoolClosedError('The resource pool was closed')
-        ret = ResourcePoolResult()
-        idles = self._idle_resources.get(key)
-        if idles:
-            item = idles.pop()
-            self._busy_resources.setdefault(key, []).append(item)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _KeyBucket()
+        elif bucket.idle:
+            # fast path, reuse the most recently released resource
+            item = bucket.idle.pop()
+            del self._idle_order[item]
+            bucket.busy.add(item)
             self._num_idle -= 1
-            ret.idle = item
-        else:
-            need_close, need_open = self._open_new_resource_if_permit(key)
-            if need_open is None:
-                fut = self.future_class()
-                self._waitings.setdefault(key, []).append(fut)
-                ret.need_wait = fut
-            else:
-                ret.need_close = need_close
-                ret.need_open = need_open
-        return ret
+            return ResourcePoolResult(idle=item)
+        need_close, need_open = self._open_new_resource_if_permit(key, bucket)
+        if need_open is not None:
+            return ResourcePoolResult(need_open=need_open, need_close=need_close)
+        fut = self.future_class()
+        if not bucket.waitings:
+            self._waiting_keys[key] = None
+        bucket.waitings.append(fut)
+        self._num_waiting += 1
+        return ResourcePoolResult(need_wait=fut)
+
+    def prune(self, max_idle_time, now=None):
+        """Remove resources which idle longer than max_idle_time
+
+        Params:
+            max_idle_time (float): max idle time in seconds
+            now (float): current time.monotonic()
+        Returns:
+            list of resources need close
+        """
+        if now is None:
+            now = monotonic()
+        need_close = []
+        idle_order = self._idle_order
+        while idle_order:
+            oldest = next(iter(idle_order))
+            if now - oldest.idle_since <= max_idle_time:
+                break
+            need_close.append(self._remove_oldest_idle_resource())
+        return need_close
 
-    def close(self, *args, **kwargs):
+    def close(self, force=False):
         """Close resource pool
 
         Params:
@@ -193,27 +288,25 @@ class ResourcePool:
                  need_close: list of resources need close
                  need_wait: list of futures need wait
         """
-        with self._lock:
-            return self._close(*args, **kwargs)
-
-    def _close(self, force=False):
         need_close = []
         need_wait = []
         self._closed = True
 
-        for fut in chain.from_iterable(self._waitings.values()):
-            need_wait.append(fut)
-        self._waitings.clear()
-
-        for item in chain.from_iterable(self._idle_resources.values()):
-            need_close.append(item)
-        self._idle_resources.clear()
-        self._num_idle = 0
-
+        for bucket in self._buckets.values():
+            need_wait.extend(bucket.waitings)
+            bucket.waitings.clear()
+            need_close.extend(bucket.idle)
+            bucket.idle.clear()
+            if force:
+                need_close.extend(bucket.busy)
+                bucket.busy.clear()
+            bucket.size = 0
         if force:
-            for item in chain.from_iterable(self._busy_resources.values()):
-                need_close.append(item)
-            self._busy_resources.clear()
+            self._buckets.clear()
+        self._idle_order.clear()
+        self._waiting_keys.clear()
 
+        self._num_idle = 0
         self._num_total = 0
+        self._num_waiting = 0
         return need_close, need_wait
@@ -1,4 +1,6 @@
+import re
 import logging
+from collections.abc import Mapping
 from urllib.parse import urlparse, urljoin
 
 from requests.utils import requote_uri
@@ -17,18 +19,96 @@ from requests.sessions import (
     CaseInsensitiveDict,
     merge_hooks)
 from .adapters import CuHTTPAdapter
-from .models import CuPreparedRequest
+from .models import CuPreparedRequest, CuResponse
 from .models import MultipartBody, StreamBody
 
 logger = logging.getLogger(__name__)
 
+# headers describing the body, removed when redirect drops the body
+# https://github.com/requests/requests/issues/3490
+_PURGED_HEADERS = ('Content-Length', 'Content-Type', 'Transfer-Encoding')
+
+# scheme and netloc without brackets, which urlparse checks as IPv6
+_SCHEME_NETLOC_RE = re.compile(r'([A-Za-z][A-Za-z0-9+.\-]*)://([^/?#\[\]]*)(?=[/?#]|$)')
+
+# urls which requote_uri keeps unchanged, '%' is excluded because
+# requote_uri unquotes unreserved characters and fixes invalid escapes
+_SAFE_URL_RE = re.compile(r"[A-Za-z0-9\-._~:/?#\[\]@!$&'()*+,;=]*")
+
+
+class _VersionedCookieJar(RequestsCookieJar):
+    """Cookie jar which counts its changes, used to cache merged cookies"""
+
+    version = 0
+
+    def set_cookie(self, cookie, *args, **kwargs):
+        self.version += 1
+        return super().set_cookie(cookie, *args, **kwargs)
+
+    def clear(self, *args, **kwargs):
+        self.version += 1
+        return super().clear(*args, **kwargs)
+
+
+def _merge_setting(request_setting, session_setting, dict_class=dict):
+    """merge_setting, but reuse the other setting when one side is empty,
+    eg: request without headers, session without params
+    """
+    if isinstance(request_setting, Mapping) and isinstance(session_setting, Mapping):
+        if not request_setting:
+            setting = session_setting
+        elif not session_setting:
+            setting = request_setting
+        else:
+            setting = None
+        # merge_setting removes keys set to None
+        if setting is not None and None not in setting.values():
+            return setting
+    return merge_setting(request_setting, session_setting, dict_class=dict_class)
+
+
+def _normalize_url(url):
+    """Lower case the scheme as urlparse(url).geturl() does, without
+    rebuilding the url, returns (url, has netloc)
+
+    Urls geturl may rewrite, eg: empty query or params, control
+    characters, are handled by urlparse.
+    """
+    if _SAFE_URL_RE.fullmatch(url) and ';' not in url and \
+            '?#' not in url and url[-1:] not in ('?', '#'):
+        if url[:1] == '/' and url[1:2] != '/':
+            return url, False
+        match = _SCHEME_NETLOC_RE.match(url)
+        if match is not None:
+            scheme, netloc = match.groups()
+            if netloc:
+                return scheme.lower() + url[len(scheme):], True
+    parsed = urlparse(url)
+    return parsed.geturl(), bool(parsed.netloc)
+
+
+def _has_cookies(cookies):
+    """Check cookies not empty, avoid CookieJar.__len__ which walks all cookies"""
+    if isinstance(cookies, cookielib.CookieJar):
+        return bool(cookies._cookies)
+    return bool(cookies)
+
 
 class CuSession(Session):
 
+    # lower case scheme to adapter, None if some prefix is more than a scheme
+    _scheme_adapters = None
+    _scheme_adapters_items = None
+
     def __init__(self):
         super().__init__()
-        self.mount('https://', CuHTTPAdapter())
-        self.mount('http://', CuHTTPAdapter())
+        self.cookies = _VersionedCookieJar()
+        # (session cookies, its version, merged cookies, its version)
+        self._merged_cookies_cache = None
+        # one adapter for both schemes, they share the connection pool limits
+        adapter = CuHTTPAdapter()
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
 
     def __enter__(self):
         raise AttributeError(
@@ -46,6 +126,39 @@ class CuSession(Session):
     async def __aexit__(self, *args):
         await self.close()
 
+    def _get_scheme_adapters(self):
+        """Returns a ``{scheme: adapter}`` map when all adapters are mounted
+        by scheme, else None. The map is rebuilt whenever ``self.adapters``
+        changes, including changes made to it directly.
+        """
+        items = tuple(self.adapters.items())
+        if items != self._scheme_adapters_items:
+            scheme_adapters = {}
+            for prefix, adapter in items:
+                scheme, sep, rest = prefix.lower().partition('://')
+                if not sep or rest:
+                    scheme_adapters = None
+                    break
+                scheme_adapters.setdefault(scheme, adapter)
+            self._scheme_adapters = scheme_adapters
+            self._scheme_adapters_items = items
+        return self._scheme_adapters
+
+    def get_adapter(self, url):
+        """Returns the appropriate connection adapter for the given URL,
+        looked up by scheme when all adapters are mounted by scheme.
+
+        :rtype: requests.adapters.BaseAdapter
+        """
+        scheme_adapters = self._get_scheme_adapters()
+        if scheme_adapters is not None:
+            scheme, sep, _ = url.partition('://')
+            if sep:
+                adapter = scheme_adapters.get(scheme.lower())
+                if adapter is not None:
+                    return adapter
+        return super().get_adapter(url)
+
     def prepare_request(self, request):
         """Constructs a :class:`PreparedRequest <PreparedRequest>` for
         transmission and returns it. The :class:`PreparedRequest` has settings
@@ -56,15 +169,18 @@ class CuSession(Session):
             session's settings.
         :rtype: requests.PreparedRequest
         """
-        cookies = request.cookies or {}
+        if _has_cookies(request.cookies):
+            cookies = request.cookies
 
-        # Bootstrap CookieJar.
-        if not isinstance(cookies, cookielib.CookieJar):
-            cookies = cookiejar_from_dict(cookies)
+            # Bootstrap CookieJar.
+            if not isinstance(cookies, cookielib.CookieJar):
+                cookies = cookiejar_from_dict(cookies)
 
-        # Merge with session cookies
-        merged_cookies = merge_cookies(
-            merge_cookies(RequestsCookieJar(), self.cookies), cookies)
+            # Merge with session cookies
+            merged_cookies = merge_cookies(
+                merge_cookies(RequestsCookieJar(), self.cookies), cookies)
+        else:
+            merged_cookies = self._get_session_cookies()
 
         # Set environment's basic authentication if not explicitly set.
         auth = request.auth
@@ -78,14 +194,30 @@ class CuSession(Session):
             files=request.files,
             data=request.data,
             json=request.json,
-            headers=merge_setting(request.headers, self.headers, dict_class=CaseInsensitiveDict),
-            params=merge_setting(request.params, self.params),
+            headers=_merge_setting(request.headers, self.headers, dict_class=CaseInsensitiveDict),
+            params=_merge_setting(request.params, self.params),
             auth=merge_setting(auth, self.auth),
             cookies=merged_cookies,
             hooks=merge_hooks(request.hooks, self.hooks),
         )
         return p
 
+    def _get_session_cookies(self):
+        """A copy of session cookies, reused until the session cookies or
+        the copy itself changed.
+        """
+        jar = self.cookies
+        cache = self._merged_cookies_cache
+        if cache is not None:
+            cached_jar, cached_version, merged, merged_version = cache
+            if cached_jar is jar and cached_version == jar.version and \
+                    merged_version == merged.version:
+                return merged
+        merged = merge_cookies(_VersionedCookieJar(), jar)
+        if isinstance(jar, _VersionedCookieJar):
+            self._merged_cookies_cache = (jar, jar.version, merged, merged.version)
+        return merged
+
     async def _send(self, request, **kwargs):
         """Send a given PreparedRequest.
 
@@ -94,10 +226,13 @@ class CuSession(Session):
         logger.debug(f'Send request: {request}')
         # Set defaults that the hooks can utilize to ensure they always have
         # the correct parameters to reproduce the previous request.
-        kwargs.setdefault('stream', self.stream)
-        kwargs.setdefault('verify', self.verify)
-        kwargs.setdefault('cert', self.cert)
-        kwargs.setdefault('proxies', self.proxies)
+        kwargs = {
+            'stream': self.stream,
+            'verify': self.verify,
+            'cert': self.cert,
+            'proxies': self.proxies,
+            **kwargs,
+        }
 
         # It's possible that users might accidentally send a Request object.
         # Guard against that specific failure case.
@@ -118,12 +253,17 @@ class CuSession(Session):
         # Total elapsed time of the request (approximately)
         elapsed = preferred_clock() - start
         logger.debug(f'Request {request} elapsed {elapsed:.3f} seconds')
-        r.elapsed = timedelta(seconds=elapsed)
+        if isinstance(r, CuResponse):
+            # timedelta is built lazily by CuResponse.elapsed
+            r.elapsed = elapsed
+        else:
+            r.elapsed = timedelta(seconds=elapsed)
 
         # Response manipulation hooks
         r = dispatch_hook('response', hooks, r, **kwargs)
 
-        extract_cookies_to_jar(self.cookies, request, r.raw)
+        if 'Set-Cookie' in r.headers:
+            extract_cookies_to_jar(self.cookies, request, r.raw)
 
         return r
 
@@ -136,16 +276,15 @@ class CuSession(Session):
             url = f'{scheme}:{url}'
 
         # The scheme should be lower case...
-        parsed = urlparse(url)
-        url = parsed.geturl()
+        url, has_netloc = _normalize_url(url)
 
         # Facilitate relative 'location' headers, as allowed by RFC 7231.
         # (e.g. '/path/to/resource' instead of 'http://domain.tld/path/to/resource')
         # Compliant with RFC3986, we percent encode the url.
-        if not parsed.netloc:
-            url = urljoin(resp.url, requote_uri(url))
-        else:
+        if not _SAFE_URL_RE.fullmatch(url):
             url = requote_uri(url)
+        if not has_netloc:
+            url = urljoin(resp.url, url)
         return url
 
     def _get_next_method(self, resp):
@@ -153,20 +292,17 @@ class CuSession(Session):
         based on certain specs or browser behavior.
         """
         method = resp.request.method
+        status_code = resp.status_code
 
         # http://tools.ietf.org/html/rfc7231#section-6.4.4
-        if resp.status_code == 303 and method != 'HEAD':
-            method = 'GET'
-
-        # Do what the browsers do, despite standards...
-        # First, turn 302s into GETs.
-        if resp.status_code == 302 and method != 'HEAD':
-            method = 'GET'
+        # Do what the browsers do, despite standards, turn 302s into GETs.
+        if (status_code == 303 or status_code == 302) and method != 'HEAD':
+            return 'GET'
 
-        # Second, if a POST is responded to with a 301, turn it into a GET.
+        # If a POST is responded to with a 301, turn it into a GET.
         # This bizarre behaviour is explained in Issue 1704.
-        if resp.status_code == 301 and method == 'POST':
-            method = 'GET'
+        if status_code == 301 and method == 'POST':
+            return 'GET'
 
         return method
 
@@ -193,7 +329,10 @@ class CuSession(Session):
             if len(history) > self.max_redirects:
                 raise TooManyRedirects('Exceeded %s redirects.' % self.max_redirects, response=resp)
 
-            next_request = request.copy()
+            if isinstance(request, CuPreparedRequest):
+                next_request = request._redirect_copy()
+            else:
+                next_request = request.copy()
             next_request.url = self._get_next_url(resp)
             next_request.method = self._get_next_method(resp)
             logger.debug(f'Redirect to: {next_request.method} {next_request.url}')
@@ -201,9 +340,7 @@ class CuSession(Session):
 
             # https://github.com/requests/requests/issues/1084
             if resp.status_code not in (307, 308):
-                # https://github.com/requests/requests/issues/3490
-                purged_headers = ('Content-Length', 'Content-Type', 'Transfer-Encoding')
-                for header in purged_headers:
+                for header in _PURGED_HEADERS:
                     next_request.headers.pop(header, None)
                 next_request.body = None
 
@@ -246,7 +383,7 @@ class CuSession(Session):
             original_parsed = urlparse(response.request.url)
             redirect_parsed = urlparse(url)
 
-            if (original_parsed.hostname != redirect_parsed.hostname):
+            if original_parsed.hostname != redirect_parsed.hostname:
                 del headers['Authorization']
 
         # .netrc might have more auth for us on our new host.
@@ -259,15 +396,21 @@ class CuSession(Session):
     async def close(self):
         """Closes all adapters and as such the session"""
         logger.debug(f'Close session {self}')
-        for v in self.adapters.values():
+        # an adapter may be mounted to several prefixes, close it once
+        for v in dict.fromkeys(self.adapters.values()):
             await v.close()
 
 
-def session():
+def session(max_redirects=None):
     """
     Returns a :class:`CuSession` for context-management.
 
+    :param max_redirects: (optional) Maximum number of redirects allowed,
+        bounds the redirect history kept per request.
     :rtype: CuSession
     """
 
-    return CuSession()
+    s = CuSession()
+    if max_redirects is not None:
+        s.max_redirects = max_redirects
+    return s
@@ -1,8 +1,20 @@
 import codecs
+from functools import lru_cache
 from collections import namedtuple
 
 from curio.meta import finalize
 from requests.adapters import TimeoutSauce
+from urllib3.util import parse_url
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+@lru_cache(maxsize=32)
+def _get_decoder_class(encoding):
+    """Get incremental decoder class, cached because responses
+    share a few encodings
+    """
+    return codecs.getincrementaldecoder(encoding)
 
 
 async def stream_decode_response_unicode(iterator, r):
@@ -14,7 +26,7 @@ async def stream_decode_response_unicode(iterator, r):
                 yield item
             return
 
-        decoder = codecs.getincrementaldecoder(r.encoding)(errors='replace')
+        decoder = _get_decoder_class(r.encoding.lower())(errors='replace')
         async for chunk in iterator:
             rv = decoder.decode(chunk)
             if rv:
@@ -26,17 +38,26 @@ async def stream_decode_response_unicode(iterator, r):
 
 async def iter_slices(string, slice_length):
     """Iterate over slices of a string."""
-    pos = 0
-    if slice_length is None or slice_length <= 0:
-        slice_length = len(string)
-    while pos < len(string):
+    if slice_length is None or slice_length <= 0 or slice_length >= len(string):
+        if string:
+            yield string
+        return
+    for pos in range(0, len(string), slice_length):
         yield string[pos:pos + slice_length]
-        pos += slice_length
+
 
 TimeoutValue = namedtuple('TimeoutValue', 'connect read')
+RequestURL = namedtuple('RequestURL', 'scheme host port path')
+
+_NO_TIMEOUT = TimeoutValue(connect=None, read=None)
+# the last scalar timeout and its TimeoutValue, most requests use the same one
+_last_timeout = (None, _NO_TIMEOUT)
 
 
 def normalize_timeout(timeout):
+    global _last_timeout
+    if timeout is None:
+        return _NO_TIMEOUT
     if isinstance(timeout, tuple):
         try:
             connect, read = timeout
@@ -50,30 +71,53 @@ def normalize_timeout(timeout):
     elif isinstance(timeout, TimeoutSauce):
         raise ValueError('Not support urllib3 Timeout object')
     else:
-        timeout = TimeoutValue(connect=timeout, read=timeout)
+        last, value = _last_timeout
+        if last is not None and type(last) is type(timeout) and last == timeout:
+            return value
+        value = TimeoutValue(connect=timeout, read=timeout)
+        _last_timeout = (timeout, value)
+        timeout = value
     return timeout
 
 
+# sentinel for missing key, None is a valid value
+_MISSING = object()
+
+
 def select_proxy(scheme, host, port, proxies):
     """Select a proxy for the url, if applicable.
 
     :param scheme, host, port: The url being for the request
     :param proxies: A dictionary of schemes or schemes and hosts to proxy URLs
     """
-    proxies = proxies or {}
+    # most requests have no proxies, skip building the keys
+    if not proxies:
+        return None
     if host is None:
         return proxies.get(scheme, proxies.get('all'))
 
-    proxy_keys = [
-        scheme + '://' + host,
-        scheme,
-        'all://' + host,
-        'all',
-    ]
-    proxy = None
-    for proxy_key in proxy_keys:
-        if proxy_key in proxies:
-            proxy = proxies[proxy_key]
-            break
-
-    return proxy
+    # check in order of priority, a key with None value means no proxy
+    for proxy_key in (f'{scheme}://{host}', scheme, f'all://{host}', 'all'):
+        proxy = proxies.get(proxy_key, _MISSING)
+        if proxy is not _MISSING:
+            return proxy
+    return None
+
+
+def parse_request_url(request):
+    """Parse url of the prepared request, the result is cached on the request.
+
+    :param request: The :class:`PreparedRequest <PreparedRequest>`
+    :rtype: RequestURL, path is the request target, eg: /get?a=1
+    """
+    cached = getattr(request, '_parsed_url', None)
+    if cached is not None and cached[0] == request.url:
+        return cached[1]
+    url = parse_url(request.url)
+    scheme = url.scheme
+    # strip brackets of IPv6 address
+    host = url.host.strip('[]') if url.host else url.host
+    port = url.port or DEFAULT_PORTS.get(scheme)
+    parsed = RequestURL(scheme=scheme, host=host, port=port, path=url.request_uri)
+    request._parsed_url = (request.url, parsed)
+    return parsed
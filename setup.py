@@ -22,8 +22,10 @@ setup(
         'yarl',
         'curio',
         'requests',
-        'namedlist',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+    },
     zip_safe=False,
     classifiers=[
         'Intended Audience :: Developers',
@@ -0,0 +1,23 @@
+import inspect
+import pytest
+from curequests import CuSession
+from utils import run_in_kernel
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run async test functions in the shared curio kernel"""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    funcargs = pyfuncitem.funcargs
+    argnames = pyfuncitem._fixtureinfo.argnames
+    run_in_kernel(pyfuncitem.obj(**{name: funcargs[name] for name in argnames}))
+    return True
+
+
+@pytest.fixture(scope='module')
+def session():
+    """A session shared by tests of a module, so connections are reused"""
+    s = CuSession()
+    yield s
+    run_in_kernel(s.close())
@@ -1,16 +1,13 @@
 import json
 from curio.meta import finalize
 from curequests import get, post
-from utils import run_with_curio
 
 
-@run_with_curio
 async def test_get(httpbin_both):
     r = await get(httpbin_both + '/get')
     assert r.status_code == 200
 
 
-@run_with_curio
 async def test_post(httpbin_both):
     data = {'hello': 'world'}
     r = await post(httpbin_both + '/post', json=data)
@@ -18,14 +15,12 @@ async def test_post(httpbin_both):
     assert r.json()['json'] == data
 
 
-@run_with_curio
 async def test_gzip(httpbin_both):
     r = await get(httpbin_both + '/gzip')
     assert r.status_code == 200
     assert r.json()
 
 
-@run_with_curio
 async def test_chunked(httpbin_both):
     r = await get(httpbin_both + '/stream/1', stream=True)
     assert r.status_code == 200
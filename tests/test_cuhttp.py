@@ -0,0 +1,101 @@
+import gzip
+import zlib
+import pytest
+from curio import socket
+from curequests.cuhttp import RequestSerializer, ResponseParser
+from curequests.cuhttp import MAX_COALESCE_BODY_SIZE
+from curequests import cuhttp
+
+
+async def serialize(serializer):
+    chunks = []
+    async for chunk in serializer:
+        chunks.append(chunk)
+    return chunks
+
+
+async def test_serialize_small_body():
+    serializer = RequestSerializer('/post', 'POST', body=b'hello')
+    chunks = await serialize(serializer)
+    assert len(chunks) == 1
+    assert chunks[0].startswith(b'POST /post HTTP/1.1\r\n')
+    assert chunks[0].endswith(b'Content-Length: 5\r\n\r\nhello')
+
+
+async def test_serialize_large_body():
+    body = b'x' * (MAX_COALESCE_BODY_SIZE + 1)
+    serializer = RequestSerializer('/post', 'POST', body=body)
+    chunks = await serialize(serializer)
+    assert len(chunks) == 1
+    headers, chunk = chunks[0]
+    assert headers.endswith(b'\r\n\r\n')
+    assert chunk is body
+
+
+async def test_serialize_headers():
+    headers = {'X-Str': 'caf\xe9', 'X-Bytes': b'raw', 'X-Int': 1}
+    serializer = RequestSerializer('/', headers=headers)
+    chunks = await serialize(serializer)
+    assert chunks == [
+        b'GET / HTTP/1.1\r\n'
+        b'X-Str: caf\xe9\r\n'
+        b'X-Bytes: raw\r\n'
+        b'X-Int: 1\r\n'
+        b'\r\n'
+    ]
+
+
+async def test_parse_chunked_body():
+    sock, peer = socket.socketpair()
+    await peer.sendall(
+        b'HTTP/1.1 200 OK\r\n'
+        b'Transfer-Encoding: chunked\r\n'
+        b'\r\n'
+        b'5\r\nhello\r\n'
+        b'6\r\n world\r\n'
+        b'0\r\n\r\n'
+    )
+    response = await ResponseParser(sock).parse()
+    chunks = []
+    async for chunk in response.stream():
+        chunks.append(chunk)
+    # body chunks of one received data are joined
+    assert chunks == [b'hello world']
+    await sock.close()
+    await peer.close()
+
+
+async def read_body(encoding, body):
+    sock, peer = socket.socketpair()
+    await peer.sendall(
+        b'HTTP/1.1 200 OK\r\n'
+        b'Content-Encoding: ' + encoding + b'\r\n'
+        b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+        b'\r\n' + body
+    )
+    response = await ResponseParser(sock).parse()
+    try:
+        return await response.read()
+    finally:
+        await sock.close()
+        await peer.close()
+
+
+@pytest.mark.parametrize('encoding, body', [
+    (b'gzip', gzip.compress(b'hello world')),
+    (b'gzip', gzip.compress(b'hello ') + gzip.compress(b'world')),
+    (b'deflate', zlib.compress(b'hello world')),
+    (b'deflate', zlib.compress(b'hello world')[2:-4]),
+])
+async def test_read_compressed_body(encoding, body):
+    assert await read_body(encoding, body) == b'hello world'
+
+
+def test_format_header_cache():
+    cuhttp._encode_cached_header.cache_clear()
+    headers = {'User-Agent': 'ua', 'Authorization': 'secret', 'Content-Length': 10}
+    serializer = RequestSerializer('/', headers=headers)
+    assert serializer._format_headers() == (
+        b'GET / HTTP/1.1\r\nUser-Agent: ua\r\n'
+        b'Authorization: secret\r\nContent-Length: 10\r\n\r\n')
+    assert cuhttp._encode_cached_header.cache_info().currsize == 1
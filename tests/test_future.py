@@ -0,0 +1,28 @@
+import pytest
+import curio
+from curequests.future import Future
+
+
+async def test_future_result():
+    fut = Future()
+
+    async def notify():
+        await fut.set_result('A')
+
+    await curio.spawn(notify)
+    assert await fut == 'A'
+
+
+async def test_future_reuse():
+    fut = Future.acquire()
+    await fut.set_result('A')
+    assert await fut == 'A'
+    fut.release()
+
+    reused = Future.acquire()
+    assert reused is fut
+    await reused.set_exception(ValueError('B'))
+    with pytest.raises(ValueError):
+        await reused
+    reused.release()
+    assert Future.acquire() is fut
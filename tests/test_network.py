@@ -0,0 +1,75 @@
+import os
+import curio
+import pytest
+from curio import socket
+from curio.file import AsyncFile
+from curequests import network
+from curequests.network import sendall_buffered, sendfile, FileRange
+
+
+class FakeSocket:
+
+    def __init__(self):
+        self.sent = []
+
+    async def sendall(self, data):
+        self.sent.append(bytes(data))
+
+    async def sendmsg(self, buffers):
+        data = b''.join(buffers)
+        self.sent.append(data)
+        return len(data)
+
+
+async def iter_chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_sendall_buffered():
+    sock = FakeSocket()
+    chunks = [b'a' * 3, b'b' * 3, b'c' * 4, b'd' * 2, b'e' * 20, b'f']
+    await sendall_buffered(sock, iter_chunks(chunks), buffer_size=8)
+    # small chunks and the large chunk after them are sent together
+    assert sock.sent == [
+        b'aaabbbcccc',
+        b'dd' + b'e' * 20,
+        b'f',
+    ]
+
+
+async def test_sendall_buffered_file_range(tmpdir):
+    path = tmpdir.join('data.bin')
+    data = bytes(range(256)) * 1024
+    path.write_binary(data)
+    sock, peer = socket.socketpair()
+    with open(str(path), 'rb') as f:
+        file_range = FileRange(AsyncFile(f), 10, len(data) - 20)
+        chunks = [b'head', file_range, b'tail']
+        send_task = await curio.spawn(sendall_buffered, sock, iter_chunks(chunks))
+        received = bytearray()
+        expect = b'head' + data[10:-10] + b'tail'
+        while len(received) < len(expect):
+            received += await peer.recv(64 * 1024)
+        await send_task.join()
+    assert received == expect
+    await sock.close()
+    await peer.close()
+
+
+@pytest.mark.parametrize('has_sendfile', [True, False])
+async def test_sendfile_short_file(tmpdir, monkeypatch, has_sendfile):
+    if not has_sendfile:
+        monkeypatch.delattr(network.os, 'sendfile', raising=False)
+    elif not hasattr(os, 'sendfile'):
+        pytest.skip('os.sendfile not available')
+    path = tmpdir.join('data.bin')
+    path.write_binary(b'x' * 100)
+    sock, peer = socket.socketpair()
+    with open(str(path), 'rb') as f:
+        file_range = FileRange(AsyncFile(f), 10, 200)
+        with pytest.raises(IOError, match='shorter than expected'):
+            await sendfile(sock, file_range)
+    assert await peer.recv(1024) == b'x' * 90
+    await sock.close()
+    await peer.close()
@@ -1,10 +1,8 @@
 import pytest
 from curequests import session
 from requests.exceptions import TooManyRedirects
-from utils import run_with_curio
 
 
-@run_with_curio
 async def test_redirect(httpbin_both):
     s = session()
     s.max_redirects = 3
@@ -1,48 +1,40 @@
-from curequests.resource_pool import ResourcePool
+from curequests.resource_pool import ResourcePool, ResourcePoolStats
 from curequests.future import Future
-from utils import run_with_curio
 
 
-@run_with_curio
 async def test_resource_pool_idle():
     pool = ResourcePool(Future, max_items_total=1)
     # get resource A
     ga1 = pool.get('A')
     assert ga1.need_open
     A = ga1.need_open
-    assert pool.num_total == 1
-    assert pool.num_idle == 0
+    assert pool.stats() == ResourcePoolStats(total=1, idle=0, busy=1, waiting=0)
 
     # put pack A
     pa1 = pool.put(A)
     assert not pa1.need_close
     assert not pa1.need_notify
-    assert pool.num_total == 1
-    assert pool.num_idle == 1
+    assert pool.stats() == ResourcePoolStats(total=1, idle=1, busy=0, waiting=0)
 
     # get A again
     ga2 = pool.get('A')
     assert ga2.idle == A
-    assert pool.num_total == 1
-    assert pool.num_idle == 0
+    assert pool.stats() == ResourcePoolStats(total=1, idle=0, busy=1, waiting=0)
 
 
-@run_with_curio
 async def test_resource_pool_wait_and_notify_same_key():
     pool = ResourcePool(Future, max_items_total=1)
     # open a resource
     ga1 = pool.get('A')
     assert ga1.need_open
     A = ga1.need_open
-    assert pool.num_total == 1
-    assert pool.num_idle == 0
+    assert pool.stats() == ResourcePoolStats(total=1, idle=0, busy=1, waiting=0)
 
     # get A again, need wait
     ga2 = pool.get('A')
     assert not ga2.idle
     assert ga2.need_wait
-    assert pool.num_total == 1
-    assert pool.num_idle == 0
+    assert pool.stats() == ResourcePoolStats(total=1, idle=0, busy=1, waiting=1)
 
     # put pack A
     pa1 = pool.put(A)
@@ -53,11 +45,9 @@ async def test_resource_pool_wait_and_notify_same_key():
 
     ga2 = await ga2.need_wait
     assert ga2.idle == A
-    assert pool.num_total == 1
-    assert pool.num_idle == 0
+    assert pool.stats() == ResourcePoolStats(total=1, idle=0, busy=1, waiting=0)
 
 
-@run_with_curio
 async def test_resource_pool_wait_and_notify_diff_key():
     pool = ResourcePool(Future, max_items_per_key=2, max_items_total=2)
     # open two resource
@@ -101,7 +91,6 @@ async def test_resource_pool_wait_and_notify_diff_key():
     assert pool.size('B') == 0
 
 
-@run_with_curio
 def test_put_when_pool_closed():
     pool = ResourcePool(Future)
     ga = pool.get('A')
@@ -110,7 +99,6 @@ def test_put_when_pool_closed():
     assert ret.need_close
 
 
-@run_with_curio
 async def test_close():
     pool = ResourcePool(Future, max_items_per_key=2, max_items_total=3)
     # make an idle resource
@@ -126,3 +114,54 @@ async def test_close():
     need_close, need_wait = pool.close(force=True)
     assert len(need_close) == 3
     assert len(need_wait) == 0
+
+
+async def test_forget_unused_key():
+    pool = ResourcePool(Future, max_items_per_key=1, max_items_total=1)
+    # open and put back A
+    ga = pool.get('A')
+    pool.put(ga.need_open)
+    # open B, the idle A will be closed
+    gb = pool.get('B')
+    assert gb.need_close == ga.need_open
+    assert pool.size('A') == 0
+    assert 'A' not in pool._buckets
+    # close B
+    pool.put(gb.need_open, close=True)
+    assert pool.num_total == 0
+    assert not pool._buckets
+
+
+async def test_prune():
+    pool = ResourcePool(Future, max_items_per_key=2, max_items_total=3)
+    ga1 = pool.get('A')
+    ga2 = pool.get('A')
+    gb = pool.get('B')
+    pool.put(ga1.need_open)
+    pool.put(gb.need_open)
+    now = ga1.need_open.idle_since
+
+    assert pool.prune(10, now=now) == []
+    need_close = pool.prune(10, now=now + 60)
+    assert set(need_close) == {ga1.need_open, gb.need_open}
+    assert pool.num_total == 1
+    assert pool.num_idle == 0
+    assert pool.size('A') == 1
+    assert pool.size('B') == 0
+    assert pool.get('A').need_open
+    assert ga2.need_open
+
+
+async def test_close_oldest_idle():
+    pool = ResourcePool(Future, max_items_total=2)
+    A = pool.get('A').need_open
+    B = pool.get('B').need_open
+    pool.put(A)
+    pool.put(B)
+    # pool is full, the oldest idle resource A will be closed
+    gc1 = pool.get('C')
+    assert gc1.need_close is A
+    assert gc1.need_open
+    assert pool.size('A') == 0
+    assert pool.num_idle == 1
+    assert pool.get('B').idle is B
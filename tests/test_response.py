@@ -1,42 +1,46 @@
+import math
+import json
+import pytest
+from datetime import timedelta
 from curio.meta import finalize
 from curequests import get
-from utils import run_with_curio
+from curequests import models
+from curequests.models import CuResponse
 
 
-@run_with_curio
 async def test_response_iter_stream(httpbin):
     r = await get(httpbin + f'/bytes/{80*1024}', stream=True)
-    body = []
+    body = bytearray()
     async with finalize(r.__aiter__()) as gen:
         async for chunk in gen:
-            body.append(chunk)
+            body.extend(chunk)
         assert r.connection.closed
-    assert len(b''.join(body)) == 80 * 1024
+    assert len(body) == 80 * 1024
 
 
-@run_with_curio
 async def test_response_iter_not_stream(httpbin):
     r = await get(httpbin + f'/bytes/{80*1024}')
-    body = []
+    # the body was read, keep-alive connection is back in the pool
+    assert r.connection.released == r.raw.keep_alive
+    assert r.connection.closed != r.raw.keep_alive
+    body = bytearray()
     async with finalize(r.__aiter__()) as gen:
         async for chunk in gen:
-            body.append(chunk)
-        assert r.connection.closed
-    assert len(b''.join(body)) == 80 * 1024
+            body.extend(chunk)
+    assert len(body) == 80 * 1024
 
 
-@run_with_curio
-async def test_response_iter_content(httpbin):
+@pytest.mark.parametrize('chunk_size', [1024, 64 * 1024])
+async def test_response_iter_content(httpbin, chunk_size):
     r = await get(httpbin + f'/bytes/{80*1024}', stream=True)
-    body = []
-    async with finalize(r.iter_content(1024)) as gen:
+    body = bytearray()
+    async with finalize(r.iter_content(chunk_size)) as gen:
         async for chunk in gen:
-            body.append(chunk)
+            body.extend(chunk)
         assert r.connection.closed
-    assert len(b''.join(body)) == 80 * 1024
+    assert len(body) == 80 * 1024
 
 
-@run_with_curio
 async def test_response_iter_lines(httpbin):
     r = await get(httpbin + f'/get', stream=True)
     body = []
@@ -46,14 +50,14 @@ async def test_response_iter_lines(httpbin):
         assert r.connection.closed
 
 
-@run_with_curio
 async def test_response_content(httpbin):
     r = await get(httpbin + f'/bytes/{80*1024}')
-    assert r.connection.closed
+    # the body was read, keep-alive connection is back in the pool
+    assert r.connection.released == r.raw.keep_alive
+    assert r.connection.closed != r.raw.keep_alive
     assert len(r.content) == 80 * 1024
 
 
-@run_with_curio
 async def test_decode_unicode(httpbin):
     r = await get(httpbin + f'/encoding/utf8', stream=True)
     body = []
@@ -65,10 +69,109 @@ async def test_decode_unicode(httpbin):
     assert len(body) == int(r.headers['content-length'])
 
 
-@run_with_curio
 async def test_response_close(httpbin):
     r = await get(httpbin + f'/bytes/{80*1024}', stream=True)
     assert not r.connection.closed
     async with r:
         pass
     assert r.connection.closed
+
+
+async def test_iter_lines_small_chunks():
+    r = CuResponse()
+    r._content = b'a' * 1000 + b'\nb\n\nc'
+    r._content_consumed = True
+    lines = [line async for line in r.iter_lines(chunk_size=1)]
+    assert lines == [b'a' * 1000, b'b', b'', b'c']
+
+
+async def test_iter_content_decode_consumed():
+    r = CuResponse()
+    r._content = 'h\xe9llo'.encode('utf-8')
+    r._content_consumed = True
+    r.encoding = 'utf-8'
+    chunks = [chunk async for chunk in r.iter_content(2, decode_unicode=True)]
+    assert ''.join(chunks) == 'h\xe9llo'
+    r.encoding = None
+    chunks = [chunk async for chunk in r.iter_content(2, decode_unicode=True)]
+    assert b''.join(chunks) == 'h\xe9llo'.encode('utf-8')
+
+
+def test_elapsed_lazy():
+    resp = CuResponse()
+    assert resp.elapsed == timedelta(0)
+    resp.elapsed = 1.5
+    assert resp.elapsed == timedelta(seconds=1.5)
+    assert resp.elapsed is resp.elapsed
+
+
+def test_json_cached():
+    resp = CuResponse()
+    resp._content = b'{"a": [1]}'
+    resp.encoding = 'utf-8'
+    data = resp.json()
+    assert data == {'a': [1]}
+    assert resp.json() is data
+    assert resp.json(parse_int=str) == {'a': ['1']}
+    resp._content = b'[]'
+    assert resp.json() == []
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def json_backend(request, monkeypatch):
+    """Run the test with and without orjson"""
+    if request.param == 'orjson':
+        monkeypatch.setattr(models, 'orjson', pytest.importorskip('orjson'))
+    else:
+        monkeypatch.setattr(models, 'orjson', None)
+    return request.param
+
+
+def _json_response(content):
+    resp = CuResponse()
+    resp._content = content
+    resp.encoding = 'utf-8'
+    return resp
+
+
+@pytest.mark.parametrize('content,expect', [
+    (b'{"a": 1}', {'a': 1}),
+    (b'123456789012345678901234567890', 123456789012345678901234567890),
+])
+def test_json_parse(json_backend, content, expect):
+    assert _json_response(content).json() == expect
+
+
+def test_json_nan(json_backend):
+    assert math.isnan(_json_response(b'NaN').json())
+
+
+def test_json_error(json_backend):
+    with pytest.raises(ValueError):
+        _json_response(b'{').json()
+
+
+class _FakeOrjson:
+    """Record which bodies are parsed by orjson"""
+
+    JSONDecodeError = json.JSONDecodeError
+
+    def __init__(self):
+        self.parsed = []
+
+    def loads(self, content):
+        self.parsed.append(content)
+        return json.loads(content)
+
+
+def test_json_orjson_branch(monkeypatch):
+    fake = _FakeOrjson()
+    monkeypatch.setattr(models, 'orjson', fake)
+    assert _json_response(b'{"a": 1}').json() == {'a': 1}
+    assert fake.parsed == [b'{"a": 1}']
+    # long integers and other encodings are left to json
+    assert _json_response(b'[1234567890123456789]').json() == [1234567890123456789]
+    resp = _json_response('[1]'.encode('utf-16'))
+    resp.encoding = 'utf-16'
+    assert resp.json() == [1]
+    assert fake.parsed == [b'{"a": 1}']
@@ -0,0 +1,159 @@
+import pytest
+from requests.exceptions import InvalidSchema
+from requests.cookies import RequestsCookieJar
+from requests.models import Response
+from curequests import Request
+from curequests.sessions import CuSession, session
+from curequests.adapters import CuHTTPAdapter
+
+
+def test_session_cookies_cached():
+    s = CuSession()
+    s.cookies.set('a', '1')
+    p1 = s.prepare_request(Request('GET', 'http://example.com/'))
+    p2 = s.prepare_request(Request('GET', 'http://example.com/'))
+    assert p1.headers['Cookie'] == 'a=1'
+    assert p1._cookies is p2._cookies
+
+    s.cookies.set('b', '2')
+    p3 = s.prepare_request(Request('GET', 'http://example.com/'))
+    assert p3._cookies is not p2._cookies
+    assert p3.headers['Cookie'] == 'a=1; b=2'
+
+    p4 = s.prepare_request(Request('GET', 'http://example.com/', cookies={'c': '3'}))
+    assert p4.headers['Cookie'] == 'a=1; b=2; c=3'
+    assert 'c' not in s.cookies
+
+
+def test_session_cookies_replaced():
+    s = CuSession()
+    s.prepare_request(Request('GET', 'http://example.com/'))
+    s.cookies = {'a': '1'}
+    p = s.prepare_request(Request('GET', 'http://example.com/'))
+    assert p.headers['Cookie'] == 'a=1'
+
+
+def test_request_empty_cookie_jar():
+    s = CuSession()
+    s.cookies.set('a', '1')
+    p1 = s.prepare_request(Request('GET', 'http://example.com/'))
+    p2 = s.prepare_request(Request('GET', 'http://example.com/', cookies=RequestsCookieJar()))
+    assert p2._cookies is p1._cookies
+    assert p2.headers['Cookie'] == 'a=1'
+
+
+def test_rebuild_auth_strip_other_host():
+    s = CuSession()
+    s.trust_env = False
+    resp = Response()
+    resp.request = s.prepare_request(Request('GET', 'http://Example.com/', auth=('u', 'p')))
+    same = s.prepare_request(Request('GET', 'http://example.com:80/b', auth=('u', 'p')))
+    s.rebuild_auth(same, resp)
+    assert 'Authorization' in same.headers
+    other = s.prepare_request(Request('GET', 'http://other.com/', auth=('u', 'p')))
+    s.rebuild_auth(other, resp)
+    assert 'Authorization' not in other.headers
+
+
+def test_redirect_copy():
+    s = CuSession()
+    s.cookies.set('a', '1')
+    p = s.prepare_request(Request('POST', 'http://example.com/', data={'k': 'v'}))
+    r = p._redirect_copy()
+    assert type(r) is type(p)
+    assert r.headers == p.headers and r.headers is not p.headers
+    assert r.body is p.body
+    r._cookies.set('b', '2')
+    assert 'b' not in p._cookies
+    assert r._cookies['a'] == '1'
+
+
+def test_prepare_merge_setting():
+    s = CuSession()
+    p = s.prepare_request(Request('GET', 'http://example.com/'))
+    assert p.headers == s.headers
+    assert p.url == 'http://example.com/'
+
+    s.headers['Accept'] = None
+    s.params = {'a': '1'}
+    p = s.prepare_request(Request('GET', 'http://example.com/', headers={'X': 'y'}))
+    assert 'Accept' not in p.headers
+    assert p.headers['X'] == 'y'
+    assert p.url == 'http://example.com/?a=1'
+
+    s.params = {}
+    p = s.prepare_request(Request('GET', 'http://example.com/', params={'b': '2', 'c': None}))
+    assert p.url == 'http://example.com/?b=2'
+
+
+def test_get_adapter():
+    s = CuSession()
+    http = s.get_adapter('HTTP://example.com/')
+    assert http is s.adapters['http://']
+    assert s.get_adapter('https://example.com/') is s.adapters['https://']
+
+    other = CuHTTPAdapter()
+    s.mount('http://example.com', other)
+    assert s.get_adapter('http://example.com/x') is other
+    assert s.get_adapter('http://example.org/') is http
+    with pytest.raises(InvalidSchema):
+        s.get_adapter('ftp://example.com/')
+
+
+def test_get_adapter_direct_change():
+    s = CuSession()
+    assert s.get_adapter('http://example.com/') is s.adapters['http://']
+    other = CuHTTPAdapter()
+    s.adapters['http://'] = other
+    assert s.get_adapter('http://example.com/') is other
+    s.adapters['http://example.com'] = CuHTTPAdapter()
+    s.adapters.move_to_end('http://')
+    assert s.get_adapter('http://example.com/') is s.adapters['http://example.com']
+    del s.adapters['http://example.com']
+    assert s.get_adapter('http://example.com/') is other
+
+
+def test_session_max_redirects():
+    assert session().max_redirects == CuSession().max_redirects
+    assert session(max_redirects=3).max_redirects == 3
+
+
+@pytest.mark.parametrize('location,expect', [
+    ('/b', 'http://example.com/b'),
+    ('/b c', 'http://example.com/b%20c'),
+    ('/%7Eb', 'http://example.com/~b'),
+    ('//other.com/b', 'http://other.com/b'),
+    ('HTTPS://other.com/b', 'https://other.com/b'),
+    ('Http://other.com/b?', 'http://other.com/b'),
+    ('/b;p?q', 'http://example.com/b;p?q'),
+])
+def test_get_next_url(location, expect):
+    resp = Response()
+    resp.url = 'http://example.com/a'
+    resp.headers['Location'] = location
+    assert CuSession()._get_next_url(resp) == expect
+
+
+async def test_close_shared_adapter():
+    s = CuSession()
+    adapter = s.adapters['http://']
+    assert s.adapters['https://'] is adapter
+    calls = []
+
+    async def close():
+        calls.append(adapter)
+
+    adapter.close = close
+    await s.close()
+    assert calls == [adapter]
+
+
+def test_rebuild_auth_invalid_port():
+    s = CuSession()
+    s.trust_env = False
+    resp = Response()
+    resp.request = s.prepare_request(Request('GET', 'http://example.com/', auth=('u', 'p')))
+    prepared = s.prepare_request(Request('GET', 'http://example.com/', auth=('u', 'p')))
+    prepared.url = 'http://other.com:99999/'
+    s.rebuild_auth(prepared, resp)
+    assert 'Authorization' not in prepared.headers
@@ -1,73 +1,68 @@
+import io
 import pytest
+import curio
 from curequests import post
+from curequests.models import MultipartBody, Field, StreamBody
+from curequests.network import FileRange
 from curio.file import aopen
 from requests.exceptions import UnrewindableBodyError
-from utils import run_with_curio
 
 TEST_DATA = 'test data\n'
 
 
-@run_with_curio
-async def test_upload_file(httpbin_both):
-    files = {'file': open('tests/upload.txt', 'rb')}
-    r = await post(httpbin_both + '/post', files=files)
+async def test_upload_file(httpbin_both, session):
+    with open('tests/upload.txt', 'rb') as f:
+        r = await session.post(httpbin_both + '/post', files={'file': f})
     assert r.ok
     assert r.json()['files']['file'] == TEST_DATA
 
 
-@pytest.mark.skip('TODO: curio.aopen has some issues')
-@run_with_curio
-async def test_upload_asyncfile(httpbin_both):
-    files = {'file': aopen('tests/upload.txt', 'rb')}
-    r = await post(httpbin_both + '/post', files=files)
+async def test_upload_asyncfile(httpbin_both, session):
+    async with aopen('tests/upload.txt', 'rb') as f:
+        r = await session.post(httpbin_both + '/post', files={'file': f})
     assert r.ok
     assert r.json()['files']['file'] == TEST_DATA
 
 
-@run_with_curio
-async def test_upload_headers(httpbin_both):
-    f = ('upload.txt', open('tests/upload.txt', 'rb'), 'text/plain')
-    files = {'file': f}
-    r = await post(httpbin_both + '/post', files=files)
+async def test_upload_headers(httpbin_both, session):
+    with open('tests/upload.txt', 'rb') as f:
+        files = {'file': ('upload.txt', f, 'text/plain')}
+        r = await session.post(httpbin_both + '/post', files=files)
     assert r.ok
     assert r.json()['files']['file'] == TEST_DATA
 
 
-@run_with_curio
-async def test_upload_string(httpbin_both):
+async def test_upload_string(httpbin_both, session):
     f = ('upload.txt', TEST_DATA)
     files = {'file': f}
-    r = await post(httpbin_both + '/post', files=files)
+    r = await session.post(httpbin_both + '/post', files=files)
     assert r.ok
     assert r.json()['files']['file'] == TEST_DATA
 
 
 @pytest.mark.skip('the server not support chunked request')
-@run_with_curio
-async def test_chunked_request(httpbin_both):
+async def test_chunked_request(httpbin_both, session):
     def gen():
         yield b'hi'
         yield b'there'
-    r = await post(httpbin_both + '/post', data=gen())
+    r = await session.post(httpbin_both + '/post', data=gen())
     assert r.ok
 
 
-@run_with_curio
-async def test_stream_upload(httpbin_both):
+async def test_stream_upload(httpbin_both, session):
     with open('tests/upload.txt', 'rb') as f:
-        r = await post(httpbin_both + '/post', data=f)
+        r = await session.post(httpbin_both + '/post', data=f)
     assert r.ok
     assert r.json()['data'] == TEST_DATA
 
 
-@run_with_curio
 async def test_redirect_upload_file():
     # FIXME: Maybe pytest-httpbin's bug, will cause Broken Pipe when
     # send the request to local httpbin. httpbin.org and gunicorn is OK.
     httpbin_both = 'http://httpbin.org'
     url = httpbin_both + '/redirect-to'
-    files = {'file': open('tests/upload.txt', 'rb')}
-    r = await post(url, files=files, params={'url': '/post', 'status_code': 307})
+    with open('tests/upload.txt', 'rb') as f:
+        r = await post(url, files={'file': f}, params={'url': '/post', 'status_code': 307})
     assert r.ok
     assert r.history[0].status_code == 307
     assert r.json()['files']['file'] == TEST_DATA
@@ -83,8 +78,74 @@ class UnrewindableFile:
         return 7
 
 
-@run_with_curio
 async def test_redirect_upload_unrewindable():
     url = 'http://httpbin.org' + '/redirect-to'
     with pytest.raises(UnrewindableBodyError):
         await post(url, data=UnrewindableFile(), params={'url': '/post', 'status_code': 307})
+
+
+async def test_upload_large_data(httpbin_both, session):
+    data = b'x' * (256 * 1024)
+    r = await session.post(httpbin_both + '/post', data=data)
+    assert r.ok
+    assert r.json()['data'] == data.decode()
+
+
+async def test_multipart_small_fields():
+    body = MultipartBody([Field('a', content='1'), Field('b', content='2')], boundary='x')
+    chunks = [chunk async for chunk in body]
+    assert chunks == [
+        b'--x\r\nContent-Disposition: form-data; name="a"\r\n\r\n1\r\n',
+        b'--x\r\nContent-Disposition: form-data; name="b"\r\n\r\n2\r\n',
+        b'--x--\r\n',
+    ]
+    assert sum(map(len, chunks)) == len(body)
+
+
+async def test_stream_body_iter():
+    async def agen():
+        yield b'a'
+        yield b'b'
+
+    gen = agen()
+    assert StreamBody(gen).__aiter__() is gen
+    assert [chunk async for chunk in StreamBody(gen)] == [b'a', b'b']
+    assert [chunk async for chunk in StreamBody([b'c', b'd'])] == [b'c', b'd']
+
+
+async def test_stream_body_file():
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await curio.sleep(0)
+
+    task = await curio.spawn(tick)
+    data = b'line\n' * 20000
+    body = StreamBody(io.BytesIO(data))
+    chunks = [chunk async for chunk in body]
+    await task.cancel()
+    assert len(chunks) == 2
+    assert b''.join(chunks) == data
+    # file is read in thread, other tasks can run meanwhile
+    assert ticks > 0
+
+
+async def test_stream_body_file_range():
+    with open('tests/upload.txt', 'rb') as f:
+        f.read(3)
+        chunks = [chunk async for chunk in StreamBody(f).sendfile_parts(10)]
+    assert len(chunks) == 1
+    assert isinstance(chunks[0], FileRange)
+    assert (chunks[0].offset, chunks[0].count) == (3, 10)
+    body = StreamBody(io.BytesIO(b'data'))
+    assert [chunk async for chunk in body.sendfile_parts(4)] == [b'data']
+
+
+def test_multipart_random_boundary():
+    b1 = MultipartBody([Field('a', content='1')]).boundary
+    b2 = MultipartBody([Field('a', content='1')]).boundary
+    assert len(b1) == 32
+    assert b1[:16] != b2[:16]
@@ -0,0 +1,43 @@
+import pytest
+from requests import Request
+from curequests.utils import parse_request_url, normalize_timeout, select_proxy
+
+
+def test_parse_request_url():
+    request = Request('GET', 'https://[::1]/get', params={'a': 1}).prepare()
+    url = parse_request_url(request)
+    assert url.scheme == 'https'
+    assert url.host == '::1'
+    assert url.port == 443
+    assert url.path == '/get?a=1'
+    # cached until the url changed
+    assert parse_request_url(request) is url
+    request.url = 'http://httpbin.org:8080'
+    url = parse_request_url(request)
+    assert (url.host, url.port, url.path) == ('httpbin.org', 8080, '/')
+
+
+def test_normalize_timeout():
+    assert normalize_timeout(None) == (None, None)
+    assert normalize_timeout(3) == (3, 3)
+    assert normalize_timeout(3) is normalize_timeout(3)
+    assert normalize_timeout(5.0) == (5.0, 5.0)
+    assert normalize_timeout((1, 2)) == (1, 2)
+    with pytest.raises(ValueError):
+        normalize_timeout((1, 2, 3))
+
+
+def test_select_proxy():
+    proxies = {
+        'http://a.com': 'http://proxy-a',
+        'http': None,
+        'all://b.com': 'http://proxy-b',
+        'all': 'http://proxy-all',
+    }
+    assert select_proxy('http', 'a.com', 80, proxies) == 'http://proxy-a'
+    assert select_proxy('http', 'b.com', 80, proxies) is None
+    assert select_proxy('https', 'b.com', 443, proxies) == 'http://proxy-b'
+    assert select_proxy('https', 'c.com', 443, proxies) == 'http://proxy-all'
+    assert select_proxy('https', None, 443, proxies) == 'http://proxy-all'
+    assert select_proxy('http', 'a.com', 80, {}) is None
+    assert select_proxy('http', 'a.com', 80, None) is None
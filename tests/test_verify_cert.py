@@ -1,11 +1,21 @@
-from utils import run_with_curio
+from curequests.adapters import CuHTTPAdapter
+from curequests.utils import RequestURL
 
 
-@run_with_curio
 async def test_verify(httpbin_secure):
     pass
 
 
-@run_with_curio
 async def test_cert(httpbin_secure):
     pass
+
+
+def test_ssl_context_cached():
+    adapter = CuHTTPAdapter()
+    url_a = RequestURL('https', 'a.example.com', 443, '/')
+    url_b = RequestURL('https', 'b.example.com', 443, '/')
+    params_a = adapter.get_ssl_params(url_a, True, None)
+    params_b = adapter.get_ssl_params(url_b, True, None)
+    assert params_a['server_hostname'] == 'a.example.com'
+    assert params_b['server_hostname'] == 'b.example.com'
+    assert params_a['ssl_context'] is params_b['ssl_context']
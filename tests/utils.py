@@ -1,12 +1,14 @@
-import functools
+import atexit
 import curio
 
+# one kernel for all tests, creating a kernel per test is costly
+_kernel = curio.Kernel()
+atexit.register(_kernel.run, shutdown=True)
 
-def run_with_curio(f):
-    @functools.wraps(f)
-    def wrapper(*args, **kwargs):
-        try:
-            curio.run(f(*args, **kwargs))
-        except curio.TaskError as ex:
-            raise ex.__cause__ from None
-    return wrapper
+
+def run_in_kernel(coro):
+    """Run the coroutine in the shared kernel, raise its exception"""
+    try:
+        return _kernel.run(coro)
+    except curio.TaskError as ex:
+        raise ex.__cause__ from None